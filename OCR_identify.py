@@ -2,91 +2,452 @@ import pytesseract
 from PIL import Image
 import cv2
 import numpy as np
+import argparse
+import glob
+import json
+import os
+import queue
+import threading
 import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from ocr_cache import OCRCache
 
-# 设置Tesseract路径
-pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
 
+# 设置Tesseract路径(可用环境变量TESSERACT_CMD指定，找不到时使用PATH中的tesseract)
+TESSERACT_CMD = os.environ.get("TESSERACT_CMD", r'C:\Program Files\Tesseract-OCR\tesseract.exe')
+if os.path.exists(TESSERACT_CMD):
+    pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
 
-def preprocess_image(img):
-    """图像预处理增强"""
-    # 使用numpy
-    img_arr = np.array(img)
-    # cv2.imshow("Binary", img_arr)
-    # cv2.waitKey(0)
-
-    # 获取图像的宽度、高度和通道数
-    height, width, channel = img_arr.shape
+# tessdata目录，None时使用tesserocr编译时的默认路径
+TESSDATA_PATH = os.environ.get("TESSDATA_PREFIX")
+TESSERACT_CONFIG = '--psm 6 -c preserve_interword_spaces=1'
+# 并行识别的工作进程数
+OCR_WORKERS = max(1, (os.cpu_count() or 2) - 1)
 
-    # 缩放图像
-    # 将图像宽度和高度都缩小为原来的一半
-    new_width = int(width * 1.5)
-    new_height = int(height * 1.5)
-    # img_arr = cv2.resize(img_arr, (new_width, new_height), cv2.INTER_AREA)
 
-    # 转换灰度图
-    img_arr = cv2.cvtColor(img_arr, cv2.COLOR_BGR2GRAY)
-    # 自适应直方图均衡化
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-    img_arr = clahe.apply(img_arr)
+class PytesseractEngine:
+    """每次调用启动一个tesseract进程，作为备用引擎"""
+    name = "pytesseract"
 
-    # 中值滤波降噪
-    # img_arr = cv2.medianBlur(img_arr, 3)
+    def warmup(self, lang='chi_sim+eng'):
+        pass
 
-    _, binary_img = cv2.threshold(img_arr, 200, 255, cv2.THRESH_BINARY)
-    # 二值化处理
-    # 由于背景接近白色，使用阈值分割，将背景设置为白色（255），前景设置为黑色（0）
-    cv2.imshow("Binary", binary_img)
-    cv2.waitKey(0)
+    def image_to_data(self, img, lang):
+        return pytesseract.image_to_data(
+            img,
+            output_type=pytesseract.Output.DICT,
+            config=TESSERACT_CONFIG,
+            lang=lang  # 添加语言参数
+        )
 
-    return Image.fromarray(binary_img)
+    def close(self):
+        pass
 
 
-def get_dynamic_gap(data, img_size, verbose=False):
+class TesserocrEngine:
     """
-    优化版动态间距阈值计算
-    :param data: Tesseract OCR输出的字典数据
-    :param img_size: 图像尺寸 (width, height)
-    :param verbose: 是否打印调试信息
-    :return: (paragraph_threshold, line_spacing_threshold)
+    进程内常驻的tesserocr API池，语言模型只加载一次
+    输出与pytesseract.image_to_data相同结构的字典
+    """
+    name = "tesserocr"
+
+    def __init__(self, pool_size=OCR_WORKERS, tessdata_path=TESSDATA_PATH):
+        """
+        :param pool_size: 每种语言组合最多同时存在的API数(可并发识别的数量)
+        :param tessdata_path: tessdata目录
+        """
+        if tesserocr is None:
+            raise ImportError("未安装tesserocr")
+        self.pool_size = pool_size
+        self.tessdata_path = tessdata_path
+        self._pools = {}    # lang -> 空闲API队列
+        self._created = {}  # lang -> 已创建的API列表
+        self._lock = threading.Lock()
+
+    def _create_api(self, lang):
+        kwargs = dict(lang=lang, psm=tesserocr.PSM.SINGLE_BLOCK)
+        if self.tessdata_path:
+            kwargs["path"] = self.tessdata_path
+        api = tesserocr.PyTessBaseAPI(**kwargs)
+        api.SetVariable("preserve_interword_spaces", "1")
+        return api
+
+    def _acquire(self, lang):
+        with self._lock:
+            pool = self._pools.setdefault(lang, queue.Queue())
+            created = self._created.setdefault(lang, [])
+            if pool.empty() and len(created) < self.pool_size:
+                api = self._create_api(lang)
+                created.append(api)
+                return api
+        return pool.get()
+
+    def _release(self, lang, api):
+        self._pools[lang].put(api)
+
+    def warmup(self, lang='chi_sim+eng'):
+        """提前加载语言模型，避免第一次识别时等待"""
+        self._release(lang, self._acquire(lang))
+
+    def image_to_data(self, img, lang):
+        level = tesserocr.RIL.WORD
+        keys = ('level', 'page_num', 'block_num', 'par_num', 'line_num', 'word_num',
+                'left', 'top', 'width', 'height', 'conf', 'text')
+        data = {key: [] for key in keys}
+
+        api = self._acquire(lang)
+        try:
+            api.SetImage(img)
+            api.Recognize()
+            iterator = api.GetIterator()
+            if iterator is None:
+                return data
+
+            block_num = par_num = line_num = word_num = 0
+            for r in tesserocr.iterate_level(iterator, level):
+                # 按pytesseract的方式给块、段、行、词编号
+                if r.IsAtBeginningOf(tesserocr.RIL.BLOCK):
+                    block_num += 1
+                    par_num = line_num = word_num = 0
+                if r.IsAtBeginningOf(tesserocr.RIL.PARA):
+                    par_num += 1
+                    line_num = word_num = 0
+                if r.IsAtBeginningOf(tesserocr.RIL.TEXTLINE):
+                    line_num += 1
+                    word_num = 0
+                word_num += 1
+
+                text = r.GetUTF8Text(level)
+                box = r.BoundingBox(level)
+                if text is None or box is None:
+                    continue
+                x1, y1, x2, y2 = box
+                data['level'].append(5)
+                data['page_num'].append(1)
+                data['block_num'].append(block_num)
+                data['par_num'].append(par_num)
+                data['line_num'].append(line_num)
+                data['word_num'].append(word_num)
+                data['left'].append(x1)
+                data['top'].append(y1)
+                data['width'].append(x2 - x1)
+                data['height'].append(y2 - y1)
+                data['conf'].append(r.Confidence(level))
+                data['text'].append(text)
+            return data
+        finally:
+            api.Clear()
+            self._release(lang, api)
+
+    def close(self):
+        with self._lock:
+            for apis in self._created.values():
+                for api in apis:
+                    api.End()
+            self._pools.clear()
+            self._created.clear()
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine(name="auto"):
+    """
+    获取OCR引擎(进程内单例)
+    :param name: auto(优先tesserocr) / tesserocr / pytesseract
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is not None and name in ("auto", _engine.name):
+            return _engine
+        if name in ("auto", "tesserocr"):
+            try:
+                _engine = TesserocrEngine()
+                return _engine
+            except Exception as e:
+                if name == "tesserocr":
+                    raise
+                print(f"⚠️ tesserocr不可用，使用pytesseract: {e}")
+        _engine = PytesseractEngine()
+        return _engine
+
+
+class PreprocessPipeline:
     """
-    # 初始化统计容器
-    heights = []
-    line_gaps = []
-    prev_bottom = None
+    无界面的OCR图像预处理流水线，按顺序执行配置的阶段
+    各阶段的输出缓冲区按尺寸复用，连续处理同样大小的框选区域时不再重复分配内存
+
+    可用阶段:
+        gray      转灰度(总是最先执行)
+        upscale   放大图像，auto模式下只在估计字高小于min_text_height时启用
+        clahe     自适应直方图均衡化
+        threshold 固定阈值二值化(不反相，与原preprocess_image一致)
+        otsu      Otsu自动阈值二值化，深色背景时反相
+        adaptive  局部自适应阈值二值化，适合光照不均的截图，深色背景时反相
+    """
+    STAGES = ("gray", "upscale", "clahe", "threshold", "otsu", "adaptive")
+
+    def __init__(self, stages="auto", threshold=200, clip_limit=2.0, tile_grid_size=(8, 8),
+                 block_size=31, c=10, upscale_factor=1.5, min_text_height=20):
+        """
+        :param stages: 阶段列表，或"auto"根据图像统计自动选择
+        :param threshold: threshold阶段的固定阈值
+        :param block_size: adaptive阶段的邻域大小(奇数)
+        :param c: adaptive阶段从均值中减去的常数
+        :param upscale_factor: 指定upscale阶段时的放大倍数(auto模式下按字高计算)
+        :param min_text_height: auto模式下字高低于该值(px)时放大
+        """
+        if stages != "auto":
+            unknown = [stage for stage in stages if stage not in self.STAGES]
+            if unknown:
+                raise ValueError(f"未知的预处理阶段: {unknown}")
+        self.stages = stages
+        self.threshold = threshold
+        self.block_size = block_size
+        self.c = c
+        self.upscale_factor = upscale_factor
+        self.min_text_height = min_text_height
+        self.clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tile_grid_size)
+        self.last_stages = None
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def _buffer(self, name, shape):
+        buf = self._buffers.get(name)
+        if buf is None or buf.shape != shape:
+            buf = np.empty(shape, dtype=np.uint8)
+            self._buffers[name] = buf
+        return buf
+
+    @staticmethod
+    def estimate_text_height(gray):
+        """用水平投影估计字高：取连续非空白行段高度的中位数"""
+        energy = np.abs(np.diff(gray.astype(np.int16), axis=1)).sum(axis=1)
+        ink = energy > max(energy.max() * 0.05, 1)
+        edges = np.flatnonzero(np.diff(np.concatenate(([False], ink, [False])).astype(np.int8)))
+        runs = edges[1::2] - edges[::2]
+        runs = runs[runs >= 3]  # 忽略噪点
+        return float(np.median(runs)) if runs.size else 0.0
+
+    def choose_stages(self, gray):
+        """
+        根据图像统计选择阶段
+        :return: (阶段列表, 放大倍数)
+        """
+        stages = ["gray"]
+        scale = 1.0
+        text_height = self.estimate_text_height(gray)
+        if 0 < text_height < self.min_text_height:
+            scale = min(3.0, self.min_text_height / text_height)
+            stages.append("upscale")
+
+        # 对比度低时先做均衡化
+        if gray.std() < 40:
+            stages.append("clahe")
+
+        # 背景亮度差异大(光照不均、渐变背景)时用局部阈值，否则Otsu全局阈值
+        coarse = cv2.resize(gray, (16, 16), interpolation=cv2.INTER_AREA)
+        stages.append("adaptive" if int(coarse.max()) - int(coarse.min()) > 60 else "otsu")
+        return stages, scale
+
+    def __call__(self, img):
+        """
+        :param img: PIL图像或numpy数组
+        :return: 处理后的PIL图像
+        """
+        img_arr = np.asarray(img)
+        with self._lock:
+            if img_arr.ndim == 3:
+                code = cv2.COLOR_RGBA2GRAY if img_arr.shape[2] == 4 else cv2.COLOR_RGB2GRAY
+                gray = cv2.cvtColor(img_arr, code, dst=self._buffer("gray", img_arr.shape[:2]))
+            else:
+                gray = img_arr
+
+            if self.stages == "auto":
+                stages, scale = self.choose_stages(gray)
+            else:
+                stages, scale = list(self.stages), self.upscale_factor
+            self.last_stages = stages
+
+            # 深色背景(夜间模式)时otsu/adaptive反相，保证输出为白底黑字
+            binary_type = cv2.THRESH_BINARY if gray.mean() >= 110 else cv2.THRESH_BINARY_INV
+
+            out = gray
+            for stage in stages:
+                if stage == "gray":
+                    continue
+                if stage == "upscale":
+                    size = (int(out.shape[1] * scale), int(out.shape[0] * scale))
+                    out = cv2.resize(out, size, dst=self._buffer("upscale", (size[1], size[0])),
+                                     interpolation=cv2.INTER_CUBIC)
+                elif stage == "clahe":
+                    out = self.clahe.apply(out, dst=self._buffer("clahe", out.shape))
+                elif stage == "threshold":
+                    _, out = cv2.threshold(out, self.threshold, 255, cv2.THRESH_BINARY,
+                                           dst=self._buffer("binary", out.shape))
+                elif stage == "otsu":
+                    _, out = cv2.threshold(out, 0, 255, binary_type | cv2.THRESH_OTSU,
+                                           dst=self._buffer("binary", out.shape))
+                elif stage == "adaptive":
+                    out = cv2.adaptiveThreshold(out, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, binary_type,
+                                                self.block_size, self.c, dst=self._buffer("binary", out.shape))
+
+            # 缓冲区会被下一次调用覆盖，返回前复制
+            return Image.fromarray(out.copy())
+
+
+# 与原preprocess_image相同的处理：灰度、CLAHE、固定阈值200(THRESH_BINARY)
+# 唯一的区别是灰度转换：原实现把PIL的RGB图按BGR转换(红蓝权重互换)，这里按RGB转换
+default_pipeline = PreprocessPipeline(stages=("gray", "clahe", "threshold"))
+auto_pipeline = PreprocessPipeline(stages="auto")
+
+
+def preprocess_image(img):
+    """图像预处理增强(灰度 + 自适应直方图均衡化 + 二值化)"""
+    return default_pipeline(img)
 
-    # 第一次遍历：收集基础数据
-    for i in range(len(data['text'])):
-        if not data['text'][i].strip() or int(data['conf'][i]) < 10:
-            continue
 
-        height = data['height'][i]
-        top = data['top'][i]
-        bottom = top + height
+def detect_text_region(img_arr, max_text_height=None, min_text_height=6, min_area=16, padding=None):
+    """
+    用形态学梯度+连通域快速定位文字区域
+    笔画边缘横向闭运算后连成文字行，高度超过max_text_height的连通域视为图片、按钮边框等非文字
+    :param img_arr: numpy图像(灰度或RGB)
+    :param max_text_height: 文字行的最大高度(px)，默认取max(60, 图像高度的15%)
+    :param min_text_height: 低于该高度(px)的连通域视为分隔线、状态栏边缘等
+    :param min_area: 小于该外接框面积的连通域视为噪点
+    :param padding: 裁剪框外扩的像素，默认取文字行高度中位数的一半
+    :return: (裁剪框(x0, y0, x1, y1)或None, 非文字连通域的像素掩码或None)
+    """
+    if img_arr.ndim == 3:
+        code = cv2.COLOR_RGBA2GRAY if img_arr.shape[2] == 4 else cv2.COLOR_RGB2GRAY
+        gray = cv2.cvtColor(img_arr, code)
+    else:
+        gray = img_arr
+    height, width = gray.shape
+    if max_text_height is None:
+        max_text_height = max(60, int(height * 0.15))
+
+    # 形态学梯度突出笔画边缘，深色/浅色背景都适用
+    gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, np.ones((3, 3), np.uint8))
+    _, edges = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    if not edges.any():
+        return None, None
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(9, width // 60), 3))
+    lines = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, kernel)
+
+    count, labels, comp_stats, _ = cv2.connectedComponentsWithStats(lines, connectivity=8)
+    comp_stats = comp_stats[1:]  # 去掉背景
+    box_area = comp_stats[:, cv2.CC_STAT_WIDTH] * comp_stats[:, cv2.CC_STAT_HEIGHT]
+    comp_height = comp_stats[:, cv2.CC_STAT_HEIGHT]
+    text = (comp_height >= min_text_height) & (comp_height <= max_text_height) & (box_area >= min_area)
+    if not text.any():
+        return None, None
+
+    x0 = comp_stats[text, cv2.CC_STAT_LEFT]
+    y0 = comp_stats[text, cv2.CC_STAT_TOP]
+    x1 = x0 + comp_stats[text, cv2.CC_STAT_WIDTH]
+    y1 = y0 + comp_stats[text, cv2.CC_STAT_HEIGHT]
+    if padding is None:
+        padding = max(4, int(np.median(comp_stats[text, cv2.CC_STAT_HEIGHT]) // 2))
+    box = (max(0, int(x0.min()) - padding), max(0, int(y0.min()) - padding),
+           min(width, int(x1.max()) + padding), min(height, int(y1.max()) + padding))
+
+    non_text_mask = None
+    large = np.flatnonzero(comp_height > max_text_height) + 1
+    if large.size:
+        is_large = np.zeros(count, dtype=bool)
+        is_large[large] = True
+        non_text_mask = is_large[labels]
+    return box, non_text_mask
+
+
+def auto_crop_image(img, min_reduction=0.05):
+    """
+    裁剪到文字区域的并集，并用背景色抹掉裁剪框内的大块非文字连通域
+    :param img: PIL图像
+    :param min_reduction: 像素减少比例低于该值且没有非文字区域时不裁剪，直接返回原图
+    :return: (PIL图像, 裁剪信息dict(box, dropped, pixel_reduction))
+    """
+    img_arr = np.asarray(img)
+    height, width = img_arr.shape[:2]
+    box, non_text_mask = detect_text_region(img_arr)
+    info = {"box": (0, 0, width, height), "dropped": 0, "pixel_reduction": 0.0}
+    if box is None:
+        return img, info
+
+    x0, y0, x1, y1 = box
+    reduction = 1 - (x1 - x0) * (y1 - y0) / float(width * height)
+    mask = None if non_text_mask is None else non_text_mask[y0:y1, x0:x1]
+    has_non_text = mask is not None and mask.any()
+    if reduction < min_reduction and not has_non_text:
+        return img, info
+
+    cropped = img_arr[y0:y1, x0:x1].copy()
+    if has_non_text:
+        # 隔行隔列采样非文字以外的像素，取中位数作为背景色
+        sample = cropped[::4, ::4][~mask[::4, ::4]]
+        background = np.median(sample, axis=0) if sample.size else 255
+        cropped[mask] = background
+        info["dropped"] = int(cv2.connectedComponents(mask.astype(np.uint8))[0] - 1)
+    info["box"] = box
+    info["pixel_reduction"] = reduction
+    return Image.fromarray(cropped), info
+
+
+def layout_columns(data):
+    """
+    将Tesseract输出的字典一次性转换为NumPy列，供布局分析使用
+    :return: dict(text=去除首尾空白的文本列表, valid_text=非空文本掩码, conf, top, height)
+    """
+    texts = [text.strip() for text in data['text']]
+    return {
+        'text': texts,
+        'valid_text': np.fromiter((bool(text) for text in texts), dtype=bool, count=len(texts)),
+        # 与int()一致：向零取整，兼容字符串和浮点形式的置信度
+        'conf': np.asarray(data['conf'], dtype=np.float64).astype(np.int64),
+        'top': np.asarray(data['top'], dtype=np.int64),
+        'height': np.asarray(data['height'], dtype=np.int64),
+    }
 
-        heights.append(height)
 
-        if prev_bottom is not None:
-            gap = top - prev_bottom
+def _filter_outliers(values, m=2):
+    """异常值过滤：保留与中位数之差小于m倍标准差的值"""
+    if values.size == 0:
+        return values
+    return values[np.abs(values - np.median(values)) < m * np.std(values)]
 
-            if 0 < gap < img_size[1] * 0.2:  # 过滤异常大间距
-                line_gaps.append(gap)
 
-        prev_bottom = bottom
+def get_dynamic_gap(data, img_size, verbose=False, columns=None):
+    """
+    优化版动态间距阈值计算
+    :param data: Tesseract OCR输出的字典数据
+    :param img_size: 图像尺寸 (width, height)
+    :param verbose: 是否打印调试信息
+    :param columns: 已由layout_columns转换好的列，避免重复转换
+    :return: (paragraph_threshold, line_spacing_threshold)
+    """
+    if columns is None:
+        columns = layout_columns(data)
 
-    # 异常值过滤
-    def filter_outliers(values, m=2):
-        if not values:
-            return values
-        median = np.median(values)
-        return [x for x in values if abs(x - median) < m * np.std(values)]
+    # 收集基础数据：有效词的高度，以及相邻有效词之间的间距
+    valid = columns['valid_text'] & (columns['conf'] >= 10)
+    heights = columns['height'][valid]
+    tops = columns['top'][valid]
+    gaps = tops[1:] - (tops[:-1] + heights[:-1])
+    line_gaps = gaps[(gaps > 0) & (gaps < img_size[1] * 0.2)]  # 过滤异常大间距
 
     # 计算核心统计量
-    filtered_heights = filter_outliers(heights)
-    filtered_gaps = filter_outliers(line_gaps)
+    filtered_heights = _filter_outliers(heights)
+    filtered_gaps = _filter_outliers(line_gaps)
 
-    avg_height = np.mean(filtered_heights) if filtered_heights else img_size[1] * 0.02
-    median_gap = np.median(filtered_gaps) if filtered_gaps else avg_height * 1.2
+    avg_height = np.mean(filtered_heights) if filtered_heights.size else img_size[1] * 0.02
+    median_gap = np.median(filtered_gaps) if filtered_gaps.size else avg_height * 1.2
 
     # 动态权重计算
     density = len(data['text']) / (img_size[0] * img_size[1]) if img_size[0] * img_size[1] > 0 else 0
@@ -114,95 +475,433 @@ def get_dynamic_gap(data, img_size, verbose=False):
     return paragraph_threshold, line_spacing_threshold
 
 
-def reorganize_paragraph(data, lang, img_size, dconf, dynamic_gap=False):
+def reorganize_paragraph(data, lang, img_size, dconf, dynamic_gap=False, confidences=None):
+    """
+    :param confidences: 传入列表时依次追加每个段落的平均置信度
+    """
     # 步骤2：重组段落
+    columns = layout_columns(data)
+
+    # 调整过滤阈值
+    valid = np.flatnonzero(columns['valid_text'] & (columns['conf'] >= dconf))
+    if valid.size == 0:
+        return []
+    conf = columns['conf'][valid]
+    top = columns['top'][valid]
+    height = columns['height'][valid]
+
+    # 段落判断逻辑调整(中文段落间距可能不同)：与上一个有效词的间距超过阈值即开始新段落
+    line_gap = top[1:] - (top[:-1] + height[:-1])
+    if dynamic_gap:
+        # 判断是否使用动态行距
+        _, line_thresh = get_dynamic_gap(data, img_size, verbose=False, columns=columns)
+        paragraph_threshold = 2 * line_thresh
+    else:
+        paragraph_threshold = height[1:] * 3
+    starts = np.concatenate(([0], np.flatnonzero(line_gap > paragraph_threshold) + 1))
+    ends = np.append(starts[1:], valid.size)
+
+    # 中文置信度阈值降低到30
+    avg_conf = np.add.reduceat(conf, starts) / (ends - starts)
+
+    # 中文不需要按空格拼接
+    separator = '' if lang == 'chi_sim' else ' '
+    texts = columns['text']
     paragraphs = []
-    current_para = []
-    current_conf = []
-    prev_bottom = None
+    for start, end in zip(starts[avg_conf >= 30].tolist(), ends[avg_conf >= 30].tolist()):
+        paragraphs.append(separator.join([texts[i] for i in valid[start:end].tolist()]))
+    if confidences is not None:
+        confidences.extend(avg_conf[avg_conf >= 30].tolist())
 
-    # 获取动态阈值
-    if dynamic_gap:
-        para_thresh, line_thresh = get_dynamic_gap(data, img_size, verbose=False)
+    return paragraphs
 
-    for i in range(len(data['text'])):
-        text = data['text'][i]
-        conf = int(data['conf'][i])
 
-        # 调整过滤阈值
-        if conf < dconf or not text.strip():
-            continue
+def split_bands(gray, num_bands, min_gap=6, min_band_height=40):
+    """
+    用水平投影把图像在空白行处切成若干行带，各行带高度尽量接近
+    使用每行的水平梯度能量判断空白，深色/浅色背景都适用
+    :param gray: 灰度图
+    :param num_bands: 期望的行带数
+    :param min_gap: 可以切开的最小空白高度(px)
+    :param min_band_height: 行带最小高度(px)
+    :return: [(y0, y1), ...]
+    """
+    height = gray.shape[0]
+    energy = np.abs(np.diff(gray.astype(np.int16), axis=1)).sum(axis=1)
+    blank = energy <= max(energy.max() * 0.02, 1)
 
-        # 获取位置信息
-        top, height = data['top'][i], data['height'][i]
-        bottom = top + height
+    # 找出足够高的空白行段，以其中点作为候选切分位置
+    padded = np.concatenate(([False], blank, [False]))
+    edges = np.flatnonzero(np.diff(padded.astype(np.int8)))
+    starts, ends = edges[::2], edges[1::2]
+    long_gaps = (ends - starts) >= min_gap
+    cut_candidates = ((starts[long_gaps] + ends[long_gaps]) // 2).tolist()
 
-        # 段落判断逻辑调整(中文段落间距可能不同)
-        if prev_bottom is not None:
-            line_gap = top - prev_bottom
+    target = height / num_bands
+    bands = []
+    band_start = 0
+    for cut in cut_candidates:
+        if cut - band_start >= max(target, min_band_height) and height - cut >= min_band_height:
+            bands.append((band_start, cut))
+            band_start = cut
+    bands.append((band_start, height))
+    return bands
 
-            # 判断是否使用动态行距
-            if dynamic_gap:
-                paragraph_threshold = 2 * line_thresh
-            else:
-                paragraph_threshold = height * 3
-            is_new_para = line_gap > paragraph_threshold
-
-            if is_new_para and current_para:
-                # 中文置信度阈值降低到30
-                if sum(current_conf) / len(current_conf) >= 30:
-                    # 中文不需要按空格拼接
-                    para_text = ''.join(current_para) if lang == 'chi_sim' else ' '.join(current_para)
-                    paragraphs.append(para_text)
-                current_para = []
-                current_conf = []
-
-        current_para.append(text.strip())
-        current_conf.append(conf)
-        prev_bottom = bottom
-
-    # 处理最后一个段落
-    if current_para:
-        if sum(current_conf) / len(current_conf) >= 30:
-            para_text = ''.join(current_para) if lang == 'chi_sim' else ' '.join(current_para)
-            paragraphs.append(para_text)
 
-    return paragraphs
+def _ocr_band(band_arr, lang):
+    """进程池中执行：识别单个行带(每个进程各自持有常驻的OCR引擎)"""
+    return get_engine().image_to_data(Image.fromarray(band_arr), lang)
+
 
+def _warmup_worker(lang):
+    get_engine().warmup(lang)
 
-def ocr_identify(img, lang='chi_sim+eng', d_conf=8):
+
+_band_pool = None
+
+
+def get_band_pool():
+    """
+    分带识别的进程池
+    spawn方式启动的子进程会重新执行__main__的顶层代码(main.py在顶层加载模型、启动投屏)，
+    这类平台(Windows/macOS)上改用线程池，tesserocr识别时会释放GIL，同样可以并行
+    """
+    global _band_pool
+    if _band_pool is None:
+        if multiprocessing.get_start_method() == "fork":
+            _band_pool = ProcessPoolExecutor(max_workers=OCR_WORKERS)
+        else:
+            _band_pool = ThreadPoolExecutor(max_workers=OCR_WORKERS)
+    return _band_pool
+
+
+def start_band_pool():
+    """
+    创建分带识别的进程池并立即启动全部子进程
+    fork只复制调用线程，其他线程此时持有的锁(如OCR引擎预热中的TesserocrEngine._lock)在子进程中永远不会释放，
+    因此必须在启动模型加载、OCR预热等后台线程之前，在主线程中调用
+    """
+    pool = get_band_pool()
+    # fork方式下第一次提交任务时一次性创建全部子进程，之后不再fork
+    pool.submit(int).result()
+    return pool
+
+
+def warmup_band_pool(lang='chi_sim+eng'):
+    """在每个进程中加载语言模型，子进程需已由start_band_pool启动"""
+    pool = get_band_pool()
+    for future in [pool.submit(_warmup_worker, lang) for _ in range(OCR_WORKERS)]:
+        future.result()
+
+
+def band_split_image_to_data(img, lang, num_bands=None):
+    """
+    将高图像按空白行切成行带，在进程池中并行识别后合并为一份OCR字典
+    :param img: PIL图像
+    :param num_bands: 行带数，默认等于进程数
+    :return: 与image_to_data相同结构的字典，top坐标已换算回原图
+    """
+    img_arr = np.asarray(img)
+    gray = cv2.cvtColor(img_arr, cv2.COLOR_RGB2GRAY) if img_arr.ndim == 3 else img_arr
+    bands = split_bands(gray, num_bands or OCR_WORKERS)
+    if len(bands) == 1:
+        return get_engine().image_to_data(img, lang)
+
+    pool = get_band_pool()
+    futures = [pool.submit(_ocr_band, np.ascontiguousarray(img_arr[y0:y1]), lang) for y0, y1 in bands]
+
+    merged = None
+    for (y0, _), future in zip(bands, futures):
+        data = future.result()
+        data['top'] = [top + y0 for top in data['top']]
+        if merged is None:
+            merged = {key: list(values) for key, values in data.items()}
+        else:
+            for key, values in data.items():
+                merged[key].extend(values)
+    return merged
+
+
+# 近似重复区域的OCR结果缓存
+ocr_cache = OCRCache()
+
+# 高于该值的图像在band_split="auto"时并行分带识别
+BAND_SPLIT_MIN_HEIGHT = 600
+
+
+def ocr_identify(img, lang='chi_sim+eng', d_conf=8, engine=None, use_cache=True, band_split=False,
+                 preprocess=None, auto_crop=False, stats=None):
     """
     支持中文的段落识别OCR
-    :param img: 输入图像(PIL Image或路径)
+    :param img: 输入图像(PIL Image、numpy数组或路径)
     :param lang: 使用的语言包(chi_sim=简体中文, eng=英文)
+    :param engine: OCR引擎，None时使用get_engine()
+    :param use_cache: 是否使用感知哈希缓存，重复框选几乎相同的区域时直接返回上次结果
+    :param band_split: True时按空白行切带、多进程并行识别；"auto"时仅对高图像启用
+    :param preprocess: None不做预处理；"auto"按图像统计自动选择；或PreprocessPipeline对象
+    :param auto_crop: 是否先裁剪到文字区域、抹掉图片等非文字区域，减少tesseract处理的像素
+    :param stats: 传入字典时写入各阶段耗时(timings, s)、段落置信度(confidences)、是否命中缓存(cache_hit)，
+                  启用auto_crop时还有裁剪信息(crop)，其中ocr_saved为按像素比例估计的OCR节省时间(s)
     :return: 段落列表
     """
-    # img = preprocess_image(img)
+    timings = {}
+    stage_start = time.perf_counter()
+    if isinstance(img, str):
+        img = Image.open(img)
+        img.load()
+    elif isinstance(img, np.ndarray):
+        img = Image.fromarray(img)
+    timings["load"] = time.perf_counter() - stage_start
+    if stats is not None:
+        stats.update(timings=timings, confidences=[], cache_hit=False)
+
+    if use_cache:
+        img_arr = np.asarray(img)
+        settings = (lang, d_conf, preprocess if isinstance(preprocess, (str, type(None))) else id(preprocess),
+                    auto_crop)
+        paragraphs, signature = ocr_cache.lookup(img_arr, settings)
+        if paragraphs is not None:
+            if stats is not None:
+                stats["cache_hit"] = True
+            return paragraphs
+
+    crop = None
+    if auto_crop:
+        stage_start = time.perf_counter()
+        img, crop = auto_crop_image(img)
+        timings["crop"] = time.perf_counter() - stage_start
+        if stats is not None:
+            stats["crop"] = crop
+
+    stage_start = time.perf_counter()
+    if preprocess == "auto":
+        img = auto_pipeline(img)
+    elif preprocess is not None:
+        img = preprocess(img)
+    timings["preprocess"] = time.perf_counter() - stage_start
 
     # 步骤1：获取带布局信息的OCR结果
-    data = pytesseract.image_to_data(
-        img,
-        output_type=pytesseract.Output.DICT,
-        config=f'--psm 6 -c preserve_interword_spaces=1',
-        lang=lang  # 添加语言参数
-    )
-
+    stage_start = time.perf_counter()
+    if band_split == "auto":
+        band_split = img.height >= BAND_SPLIT_MIN_HEIGHT
+    if band_split:
+        data = band_split_image_to_data(img, lang)
+    else:
+        if engine is None:
+            engine = get_engine()
+        data = engine.image_to_data(img, lang)
+    timings["ocr"] = time.perf_counter() - stage_start
+    if crop is not None:
+        # tesseract耗时大致与像素数成正比，按裁剪掉的比例估计节省的时间
+        crop["ocr_saved"] = timings["ocr"] * crop["pixel_reduction"] / max(1 - crop["pixel_reduction"], 0.01)
+
+    stage_start = time.perf_counter()
     image_size = tuple((img.width, img.height))
-    paragraphs = reorganize_paragraph(data, lang, image_size, d_conf)
+    paragraphs = reorganize_paragraph(data, lang, image_size, d_conf,
+                                      confidences=stats["confidences"] if stats is not None else None)
+    timings["layout"] = time.perf_counter() - stage_start
 
+    if use_cache:
+        ocr_cache.store(signature, settings, paragraphs)
     return paragraphs
 
 
+def identify_question(img, auto_crop=True, use_cache=True, stats=None):
+    """
+    main.py识别题目区域的方式：高图像分带并行识别，段落用空格连接成一行
+    回放测试(benchmarks/bench_replay.py)使用同一函数，测得的耗时和结果与实际使用一致
+    :return: 题目文本
+    """
+    return " ".join(ocr_identify(img, band_split="auto", auto_crop=auto_crop, use_cache=use_cache, stats=stats))
+
+
+def format_crop_stats(stats):
+    """把ocr_identify写入stats的裁剪信息格式化为一行"""
+    crop = stats.get("crop")
+    if crop is None:
+        return "自动裁剪: 未启用" if not stats.get("cache_hit") else "自动裁剪: 命中缓存，未识别"
+    return (f"自动裁剪: 像素减少 {crop['pixel_reduction']:.0%} | 抹去非文字区域 {crop['dropped']} 个 | "
+            f"裁剪耗时 {stats['timings']['crop'] * 1000:.1f}ms | 预计节省OCR {crop.get('ocr_saved', 0) * 1000:.0f}ms")
+
+
+# ==================== 批量识别 ====================
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.webp')
+
+
+def collect_images(inputs):
+    """
+    展开目录(递归)和通配符，得到去重排序后的图片路径列表
+    :param inputs: 路径、目录或通配符列表
+    """
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                paths.update(os.path.join(root, f) for f in files if f.lower().endswith(IMAGE_EXTENSIONS))
+        elif os.path.isfile(item):
+            paths.add(item)
+        else:
+            paths.update(p for p in glob.glob(item, recursive=True) if p.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(paths)
+
+
+def load_finished(output_path):
+    """读取已有的JSONL结果，返回识别成功的图片路径集合(用于断点续跑)"""
+    finished = set()
+    if not os.path.exists(output_path):
+        return finished
+    with open(output_path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # 上次中断时可能留下半行
+                continue
+            if "error" not in record:
+                finished.add(record["path"])
+    return finished
+
+
+def truncate_partial_line(output_path, chunk_size=65536):
+    """
+    上次中断时JSONL末尾可能留下半行，截断到最后一个换行符，避免下一条记录接在半行后面
+    :return: 截掉的字节数
+    """
+    if not os.path.exists(output_path):
+        return 0
+    with open(output_path, 'rb+') as f:
+        size = f.seek(0, os.SEEK_END)
+        end = size
+        while end > 0:
+            start = max(0, end - chunk_size)
+            f.seek(start)
+            chunk = f.read(end - start)
+            if end == size and chunk.endswith(b"\n"):
+                return 0
+            newline = chunk.rfind(b"\n")
+            if newline >= 0:
+                end = start + newline + 1
+                break
+            end = start
+        f.truncate(end)
+    return size - end
+
+
+def _batch_init(lang):
+    """批量识别工作进程初始化：提前加载语言模型"""
+    get_engine().warmup(lang)
+
+
+def _batch_ocr(path, lang, d_conf, preprocess, auto_crop):
+    """工作进程中执行：识别一张图片，返回一条JSONL记录"""
+    start = time.perf_counter()
+    record = {"path": path}
+    try:
+        stats = {}
+        paragraphs = ocr_identify(path, lang=lang, d_conf=d_conf, use_cache=False, preprocess=preprocess,
+                                  auto_crop=auto_crop, stats=stats)
+        record["paragraphs"] = paragraphs
+        record["confidences"] = [round(conf, 1) for conf in stats["confidences"]]
+        record["timings"] = {stage: round(t, 4) for stage, t in stats["timings"].items()}
+        if "crop" in stats:
+            record["crop"] = {"box": list(stats["crop"]["box"]),
+                              "pixel_reduction": round(stats["crop"]["pixel_reduction"], 3)}
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["total"] = round(time.perf_counter() - start, 4)
+    return record
+
+
+def batch_ocr(inputs, output_path, lang='chi_sim+eng', d_conf=8, workers=OCR_WORKERS, preprocess=None,
+              auto_crop=False, resume=True):
+    """
+    批量识别截图，结果逐条追加写入JSONL，中断后重新运行会跳过已成功的图片
+    :param inputs: 路径、目录或通配符列表
+    :param output_path: JSONL输出路径
+    :param workers: 工作进程数，每个进程持有一个常驻OCR引擎
+    :param preprocess: None 或 "auto"(工作进程中无法传递PreprocessPipeline对象)
+    :param auto_crop: 是否先裁剪到文字区域
+    :param resume: 是否跳过输出文件中已成功的图片
+    """
+    paths = collect_images(inputs)
+    if resume:
+        dropped = truncate_partial_line(output_path)
+        if dropped:
+            print(f"⚠️ 输出文件末尾有上次中断留下的半行，已截掉 {dropped} 字节")
+    finished = load_finished(output_path) if resume else set()
+    todo = [p for p in paths if p not in finished]
+    print(f"共 {len(paths)} 张图片，已完成 {len(paths) - len(todo)} 张，待识别 {len(todo)} 张 | 工作进程: {workers}")
+    if not todo:
+        return
+
+    stage_totals = {}
+    done = failed = 0
+    start_time = time.perf_counter()
+    with open(output_path, 'a' if resume else 'w', encoding='utf-8') as out, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_batch_init, initargs=(lang,)) as pool:
+        futures = [pool.submit(_batch_ocr, p, lang, d_conf, preprocess, auto_crop) for p in todo]
+        try:
+            for future in as_completed(futures):
+                record = future.result()
+                # 每条结果立即落盘，中断时最多丢失正在识别的图片
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                done += 1
+                if "error" in record:
+                    failed += 1
+                    print(f"⚠️ {record['path']}: {record['error']}")
+                else:
+                    for stage, t in record["timings"].items():
+                        stage_totals[stage] = stage_totals.get(stage, 0.0) + t
+                if done % 50 == 0 or done == len(todo):
+                    elapsed = time.perf_counter() - start_time
+                    print(f"进度: {done}/{len(todo)} | {done / elapsed:.2f} 张/s")
+        except KeyboardInterrupt:
+            print("⏹️ 用户中断，已完成的结果已保存，重新运行即可继续")
+            for future in futures:
+                future.cancel()
+            raise
+
+    elapsed = time.perf_counter() - start_time
+    succeeded = done - failed
+    print(f"完成: {succeeded} 张 | 失败: {failed} 张 | 总耗时: {elapsed:.2f}s | 吞吐量: {done / elapsed:.2f} 张/s")
+    if succeeded:
+        stage_sum = sum(stage_totals.values())
+        print("各阶段耗时(工作进程内，单张平均):")
+        for stage, total in stage_totals.items():
+            share = total / stage_sum if stage_sum else 0.0
+            print(f"  {stage:<12}{total / succeeded * 1000:>10.1f} ms{share:>8.1%}")
+
+
 if __name__ == "__main__":
-    start_time = time.time()
-    # 使用示例
-    image_path = "screenshot.jpg"
-    image = Image.open(image_path)
-    paragraphs = ocr_identify(image)
-
-    for i, para in enumerate(paragraphs, 1):
-        print(f"段落 {i}: ")
-        print(para)
-        print("-" * 40)
-
-    print(f"总耗时：{time.time() - start_time}")
+    parser = argparse.ArgumentParser(description="段落识别OCR，输入目录或通配符时批量识别并输出JSONL")
+    parser.add_argument("inputs", nargs="*", default=["screenshot.jpg"], help="图片路径、目录或通配符")
+    parser.add_argument("-o", "--output", help="JSONL输出路径，指定后总是使用批量模式")
+    parser.add_argument("--lang", default='chi_sim+eng')
+    parser.add_argument("--d-conf", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=OCR_WORKERS)
+    parser.add_argument("--preprocess", choices=["auto"], default=None)
+    parser.add_argument("--auto-crop", action="store_true", help="识别前裁剪到文字区域")
+    parser.add_argument("--no-resume", action="store_true", help="覆盖输出文件，从头识别")
+    args = parser.parse_args()
+
+    if args.output is None and len(args.inputs) == 1 and os.path.isfile(args.inputs[0]):
+        start_time = time.time()
+        # 使用示例
+        image = Image.open(args.inputs[0])
+        stats = {}
+        paragraphs = ocr_identify(image, lang=args.lang, d_conf=args.d_conf, preprocess=args.preprocess,
+                                  auto_crop=args.auto_crop, stats=stats)
+
+        for i, para in enumerate(paragraphs, 1):
+            print(f"段落 {i}: ")
+            print(para)
+            print("-" * 40)
+
+        if args.auto_crop:
+            print(format_crop_stats(stats))
+        print(f"总耗时：{time.time() - start_time}")
+    else:
+        batch_ocr(args.inputs, args.output or "ocr_results.jsonl", lang=args.lang, d_conf=args.d_conf,
+                  workers=args.workers, preprocess=args.preprocess, auto_crop=args.auto_crop,
+                  resume=not args.no_resume)
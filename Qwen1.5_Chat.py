@@ -1,36 +1,47 @@
-from transformers import AutoModelForCausalLM, AutoTokenizer
 import time
+import llm
+from llm_client import connect_or_load
 
-device = "cuda"  # the device to load the model onto
-
-model = AutoModelForCausalLM.from_pretrained(
-    "./Qwen1.5-1.8B-Chat",
-    torch_dtype="auto",
-    device_map="auto",
+# 优先使用已运行的推理服务(llm_server.py)，否则在本进程加载模型
+# 自动选择推理后端，没有GPU时使用CPU int8量化(可用环境变量QWEN_BACKEND指定)
+engine = connect_or_load(
+    backend=llm.DEFAULT_BACKEND,
     attn_implementation="eager"
 )
-
-tokenizer = AutoTokenizer.from_pretrained("./Qwen1.5-1.8B-Chat")
+engine.wait()
+
+# 本进程加载模型时使用多轮对话会话，保留历史和KV缓存，每轮只prefill新消息
+# 连接推理服务时KV缓存无法跨进程保留，在本地保存最近几轮对话，随每次请求发送(每轮重新prefill整个历史)
+MAX_HISTORY_TURNS = 8
+session = None
+history = []
+if isinstance(engine, llm.LocalLLM):
+    model, tokenizer = engine.wait()
+    session = llm.ChatSession(model, tokenizer, max_context_tokens=4096, max_new_tokens=1024)
+else:
+    print(f"已连接推理服务：保留最近{MAX_HISTORY_TURNS}轮对话，每轮重新计算整个历史(无KV缓存复用)")
 
 print("模型加载完成！")
 
 
-def get_response(input_prompt):
-    messages = [{"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user", "content": input_prompt}]
-
-    text = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-
-    model_inputs = tokenizer([text], return_tensors="pt").to(device)
-
-    generated_ids = model.generate(model_inputs.input_ids, max_new_tokens=1024)
-
-    generated_ids = [output_ids[len(input_ids):] for input_ids, output_ids in
-                     zip(model_inputs.input_ids, generated_ids)]
-
-    model_response = tokenizer.batch_decode(generated_ids, skip_special_tokens=True)[0]
+def print_response(input_prompt):
+    """边生成边打印回答，结束后输出首token耗时和解码速度"""
+    stats = {}
+    if session is not None:
+        stream = session.stream(input_prompt, stats=stats)
+    else:
+        stream = engine.stream_response(input_prompt, max_new_tokens=1024, stats=stats, history=history)
+    pieces = []
+    for text in stream:
+        pieces.append(text)
+        print(text, end="", flush=True)
+    print()
+    print(llm.format_stats(stats))
 
-    return model_response
+    if session is None:
+        history.extend([{"role": "user", "content": input_prompt},
+                        {"role": "assistant", "content": "".join(pieces)}])
+        del history[:-2 * MAX_HISTORY_TURNS]
 
 
 def get_input():
@@ -53,8 +64,7 @@ def get_input():
 
 prompt = "你好！"
 while prompt != "<end>":
-    response = get_response(prompt)
-    print(response)
+    print_response(prompt)
     prompt = get_input()
     print(f"prompt: {prompt}")
     print("==========promot_end==========\n")
@@ -14,6 +14,8 @@ FFMPEG_PATH = r"C:\ffmpeg\bin\ffmpeg.exe"
 DEFAULT_RESOLUTION = (1080, 2400)  # 默认分辨率
 MAX_RETRIES = 3  # 最大重试次数
 BUFFERED_FRAMES = 5  # 帧缓冲数量
+# 帧交付方式: "latest" 只保留最新帧，读者慢时丢弃旧帧，画面延迟不超过一帧；"fifo" 按顺序缓冲BUFFERED_FRAMES帧
+DELIVERY_MODE = "latest"
 
 
 # ==================== 工具函数 ====================
@@ -58,16 +60,99 @@ def get_device_resolution() -> Tuple[int, int]:
         return DEFAULT_RESOLUTION
 
 
+# ==================== 帧缓冲环 ====================
+class FrameRing:
+    """
+    预分配的帧缓冲环，读取线程用readinto直接把管道数据写进缓冲区，取帧时不再复制
+    槽位在空闲队列和就绪队列之间流转，交给读者的槽位在读者释放前不会被覆盖
+    """
+
+    def __init__(self, shape: Tuple[int, ...], slots: int = BUFFERED_FRAMES + 2, latest_only: bool = False):
+        """
+        :param shape: 帧形状 (高, 宽, 3)
+        :param slots: 槽位数，读者持有1个、写入线程占用1个，其余为就绪帧
+        :param latest_only: 为True时新帧发布后丢弃尚未取走的旧帧，写入线程永远不会因读者慢而阻塞
+        """
+        if latest_only and slots < 3:
+            raise ValueError("latest_only模式至少需要3个槽位")
+        self.shape = shape
+        self.latest_only = latest_only
+        self.buffers = [np.empty(shape, dtype=np.uint8) for _ in range(slots)]
+        # 每个槽位的字节视图，供readinto写入
+        self.views = [memoryview(buf).cast('B') for buf in self.buffers]
+        # 每个槽位中帧的序号和捕获时间(time.perf_counter)
+        self.seqs = [0] * slots
+        self.timestamps = [0.0] * slots
+        self.dropped = 0
+        self.free = queue.Queue()
+        self.ready = queue.Queue()
+        self._publish_lock = threading.Lock()
+        for slot in range(slots):
+            self.free.put(slot)
+
+    def acquire(self, timeout: Optional[float] = None) -> int:
+        """写入线程获取一个空闲槽位，全部被占用时阻塞(反压)"""
+        return self.free.get(timeout=timeout)
+
+    def publish(self, slot: int, seq: int = 0, timestamp: Optional[float] = None):
+        """
+        写满一帧后交给读者
+        :param seq: 帧序号
+        :param timestamp: 捕获时间，默认为当前time.perf_counter()
+        """
+        self.seqs[slot] = seq
+        self.timestamps[slot] = time.perf_counter() if timestamp is None else timestamp
+        if not self.latest_only:
+            self.ready.put(slot)
+            return
+        with self._publish_lock:
+            # 丢弃还没被取走的旧帧，读者下次拿到的总是最新帧
+            while True:
+                try:
+                    self.free.put(self.ready.get_nowait())
+                    self.dropped += 1
+                except queue.Empty:
+                    break
+            self.ready.put(slot)
+
+    def get(self, timeout: Optional[float] = None) -> int:
+        """读者取出最早的就绪槽位，超时抛出queue.Empty"""
+        return self.ready.get(timeout=timeout)
+
+    def release(self, slot: int):
+        """读者用完后归还槽位"""
+        self.free.put(slot)
+
+    def reset(self):
+        """丢弃所有就绪帧(重启管道时)，读者持有的槽位不受影响"""
+        while True:
+            try:
+                self.free.put(self.ready.get_nowait())
+            except queue.Empty:
+                return
+
+
 # ==================== 视频管道类 ====================
 class VideoPipeline:
-    def __init__(self, resolution: Tuple[int, int]):
+    def __init__(self, resolution: Tuple[int, int], delivery_mode: str = DELIVERY_MODE):
+        if delivery_mode not in ("latest", "fifo"):
+            raise ValueError(f"未知的帧交付方式: {delivery_mode}")
         self.scrcpy_proc = None
         self.ffmpeg_proc = None
-        self.frame_queue = queue.Queue(maxsize=BUFFERED_FRAMES)
         self.running = False
         self.resolution = resolution
         self.frame_size = resolution[0] * resolution[1] * 3  # BGR24格式
+        self.ring = FrameRing((resolution[1], resolution[0], 3), latest_only=delivery_mode == "latest")
+        self.held_slot = None  # 上一次get_frame交给调用方的槽位
         self.last_frame_time = 0
+        # 当前帧(上一次get_frame返回的帧)的序号和捕获时间
+        self.frame_seq = 0
+        self.frame_timestamp = 0.0
+        # 统计
+        self.frames_read = 0
+        self.frames_delivered = 0
+        self.age_total = 0.0
+        self.age_max = 0.0
 
     def start_scrcpy(self):
         """启动scrcpy进程"""
@@ -147,53 +232,84 @@ class VideoPipeline:
             if line:
                 print("ffmpeg:", line.decode(errors='ignore').strip())
 
+    def read_into(self, view: memoryview) -> int:
+        """从FFmpeg输出直接读满一个槽位，返回实际读取的字节数"""
+        stdout = self.ffmpeg_proc.stdout
+        filled = 0
+        while filled < self.frame_size and self.running:
+            count = stdout.readinto(view[filled:])
+            if not count:
+                break
+            filled += count
+        return filled
+
     def frame_reader(self):
         """帧读取线程"""
         print(f"帧读取线程启动，期望每帧大小: {self.frame_size} 字节")
 
         while self.running:
+            slot = None
             try:
-                # 读取完整帧数据
-                raw_frame = bytearray()
-                while len(raw_frame) < self.frame_size and self.running:
-                    remaining = self.frame_size - len(raw_frame)
-                    chunk = self.ffmpeg_proc.stdout.read(remaining)
-                    if not chunk:
-                        break
-                    raw_frame.extend(chunk)
-
-                if not raw_frame:
+                # 读取完整帧数据，直接写入预分配的槽位
+                slot = self.ring.acquire()
+                filled = self.read_into(self.ring.views[slot])
+                if not self.running:
+                    self.ring.release(slot)
+                    break
+
+                if filled == 0:
+                    self.ring.release(slot)
                     print("⚠️ 收到空帧，可能流已结束")
                     self.restart_pipeline()
                     continue
 
-                if len(raw_frame) != self.frame_size:
-                    print(f"⚠️ 收到不完整帧: {len(raw_frame)}/{self.frame_size} 字节")
+                if filled != self.frame_size:
+                    self.ring.release(slot)
+                    print(f"⚠️ 收到不完整帧: {filled}/{self.frame_size} 字节")
                     self.restart_pipeline()
                     continue
 
-                # 放入帧队列
-                self.frame_queue.put(bytes(raw_frame))
+                # 交给读者，读满最后一个字节的时刻作为捕获时间
+                self.frames_read += 1
+                self.ring.publish(slot, seq=self.frames_read, timestamp=time.perf_counter())
                 self.last_frame_time = time.time()
 
             except Exception as e:
+                if slot is not None:
+                    self.ring.release(slot)
                 print(f"帧读取错误: {str(e)}")
                 self.restart_pipeline()
 
+    def release_frame(self):
+        """归还上一次get_frame返回的帧，之后该数组可能被新帧覆盖"""
+        if self.held_slot is not None:
+            self.ring.release(self.held_slot)
+            self.held_slot = None
+
     def get_frame(self, timeout=1.0) -> Optional[np.ndarray]:
-        """获取一帧图像"""
+        """
+        获取一帧图像
+        返回的数组直接指向缓冲环中的槽位(不复制)，在下一次调用get_frame或release_frame前有效，
+        需要长期保存时请自行copy()
+        """
         try:
             # 如果长时间没有新帧，尝试重启管道
             if time.time() - self.last_frame_time > 3.0:
                 print("⚠️ 长时间无新帧，尝试重启管道...")
                 self.restart_pipeline()
 
-            raw_frame = self.frame_queue.get(timeout=timeout)
+            slot = self.ring.get(timeout=timeout)
+            self.release_frame()
+            self.held_slot = slot
 
-            # 将字节数据转换为numpy数组
-            frame = np.frombuffer(raw_frame, dtype=np.uint8)
-            frame = frame.reshape((self.resolution[1], self.resolution[0], 3))
-            return frame
+            # 帧龄：从读完该帧到交给调用方经过的时间
+            self.frame_seq = self.ring.seqs[slot]
+            self.frame_timestamp = self.ring.timestamps[slot]
+            age = time.perf_counter() - self.frame_timestamp
+            self.frames_delivered += 1
+            self.age_total += age
+            self.age_max = max(self.age_max, age)
+            return self.ring.buffers[slot]
 
         except queue.Empty:
             print("⚠️ 获取帧超时")
@@ -202,6 +318,15 @@ class VideoPipeline:
             print(f"获取帧错误: {str(e)}")
             return None
 
+    def frame_age(self) -> float:
+        """当前帧从读完到现在经过的时间(s)"""
+        return time.perf_counter() - self.frame_timestamp
+
+    def format_stats(self) -> str:
+        avg_age = self.age_total / self.frames_delivered if self.frames_delivered else 0.0
+        return (f"读取: {self.frames_read} | 交付: {self.frames_delivered} | 丢弃: {self.ring.dropped} | "
+                f"平均帧龄: {avg_age * 1000:.1f}ms | 最大帧龄: {self.age_max * 1000:.1f}ms")
+
     def restart_pipeline(self):
         """重启整个管道"""
         print("🔄 重启视频管道...")
@@ -213,6 +338,7 @@ class VideoPipeline:
     def start(self, max_retries=MAX_RETRIES):
         """启动管道"""
         self.running = True
+        self.last_frame_time = time.time()
         retries = 0
 
         while retries < max_retries:
@@ -242,7 +368,7 @@ class VideoPipeline:
                     proc.wait(timeout=2)
                 except subprocess.TimeoutExpired:
                     proc.kill()
-        self.frame_queue = queue.Queue(maxsize=BUFFERED_FRAMES)  # 清空队列
+        self.ring.reset()  # 清空就绪帧
 
 
 # ==================== 主程序 ====================
@@ -282,7 +408,8 @@ def main():
 
                 # 显示信息
                 cv2.putText(
-                    frame, f"FPS: {int(fps)} | 帧: {frame_count}", (10, 50),
+                    frame, f"FPS: {int(fps)} | #{pipeline.frame_seq} | {pipeline.frame_age() * 1000:.0f}ms | "
+                           f"drop: {pipeline.ring.dropped}", (10, 50),
                     cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2
                 )
 
@@ -299,6 +426,7 @@ def main():
         print("⏹️ 用户中断")
     finally:
         pipeline.running = False
+        print(pipeline.format_stats())
         pipeline.cleanup()
         cv2.destroyAllWindows()
         print("🛑 投屏已停止")
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+DEFAULT_DB_PATH = "answer_cache.db"
+
+
+def normalize_question(text):
+    """
+    归一化OCR得到的题目文本，消除全半角和空白带来的差异
+    中文OCR结果中经常夹杂多余空格，这里直接去掉所有空白
+    """
+    text = unicodedata.normalize("NFKC", text)
+    return re.sub(r"\s+", "", text)
+
+
+class AnswerCache:
+    """
+    两级答案缓存：内存LRU + SQLite持久化
+    键由归一化后的题目、题干哈希和生成参数共同决定，题干或生成参数变化时自然不会命中
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, capacity=256):
+        """
+        :param db_path: SQLite文件路径
+        :param capacity: 内存LRU容量
+        """
+        self.capacity = capacity
+        self.memory = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "key TEXT PRIMARY KEY, question TEXT, answer TEXT, created REAL, hits INTEGER DEFAULT 0)"
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(question, description, settings=None):
+        """
+        :param question: OCR得到的题目
+        :param description: 当前题干
+        :param settings: 生成参数(dict)，如模型路径、max_new_tokens
+        :return: 缓存键
+        """
+        desc_hash = hashlib.sha256(description.strip().encode("utf-8")).hexdigest()
+        settings_text = json.dumps(settings or {}, sort_keys=True, ensure_ascii=False)
+        raw = "\x1f".join([normalize_question(question), desc_hash, settings_text])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _remember(self, key, answer):
+        self.memory[key] = answer
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.capacity:
+            self.memory.popitem(last=False)
+
+    def get(self, key):
+        """命中返回答案，未命中返回None"""
+        with self._lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.memory_hits += 1
+                return self.memory[key]
+
+            row = self.conn.execute("SELECT answer FROM answers WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.conn.execute("UPDATE answers SET hits = hits + 1 WHERE key = ?", (key,))
+            self.conn.commit()
+            self.disk_hits += 1
+            self._remember(key, row[0])
+            return row[0]
+
+    def put(self, key, question, answer):
+        with self._lock:
+            self._remember(key, answer)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO answers (key, question, answer, created) VALUES (?, ?, ?, ?)",
+                (key, question, answer, time.time())
+            )
+            self.conn.commit()
+
+    def stats(self):
+        total = self.memory_hits + self.disk_hits + self.misses
+        hit_rate = (self.memory_hits + self.disk_hits) / total if total else 0.0
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": hit_rate,
+        }
+
+    def format_stats(self):
+        s = self.stats()
+        return (f"答案缓存 命中率: {s['hit_rate']:.0%} | 内存命中: {s['memory_hits']} | "
+                f"磁盘命中: {s['disk_hits']} | 未命中: {s['misses']}")
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
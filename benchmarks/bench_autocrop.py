@@ -0,0 +1,82 @@
+"""
+自动裁剪基准测试：对比裁剪前后tesseract处理的像素、实际OCR耗时和识别出的词数
+低置信度的杂词通常来自图片、按钮等非文字区域
+
+用法: python benchmarks/bench_autocrop.py [截图路径或通配符 ...] [--lang eng]
+不指定图片时使用合成的带状态栏、留白和图片的截图
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import OCR_identify
+
+
+def synthetic_screenshot(seed=0):
+    """状态栏 + 大片留白 + 题目文字 + 配图 + 按钮"""
+    rng = np.random.default_rng(seed)
+    img = np.full((1400, 1000, 3), 245, dtype=np.uint8)
+    cv2.rectangle(img, (0, 0), (1000, 44), (30, 30, 30), -1)
+    cv2.putText(img, "12:30", (16, 32), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+    lines = ["Read the passage and answer the questions below.",
+             "Which of the following is NOT mentioned?",
+             "A. The weather  B. The school  C. The river  D. The city"]
+    for i, line in enumerate(lines):
+        cv2.putText(img, line, (120, 320 + i * 42), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (20, 20, 20), 2)
+    img[520:820, 160:700] = rng.integers(0, 255, (300, 540, 3), dtype=np.uint8)
+    cv2.rectangle(img, (350, 1150), (650, 1240), (0, 120, 255), 2)
+    cv2.putText(img, "Submit", (440, 1205), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 120, 255), 2)
+    return Image.fromarray(img)
+
+
+def ocr_words(engine, img, lang):
+    start = time.perf_counter()
+    data = engine.image_to_data(img, lang)
+    elapsed = time.perf_counter() - start
+    conf = [float(c) for c, t in zip(data['conf'], data['text']) if str(t).strip()]
+    junk = sum(1 for c in conf if c < 30)
+    return elapsed, len(conf), junk
+
+
+def main():
+    parser = argparse.ArgumentParser(description="自动裁剪基准测试")
+    parser.add_argument("images", nargs="*", help="截图路径或通配符")
+    parser.add_argument("--lang", default="eng")
+    args = parser.parse_args()
+
+    if args.images:
+        paths = sorted({p for pattern in args.images for p in glob.glob(pattern)})
+        images = [(os.path.basename(p), Image.open(p).convert("RGB")) for p in paths]
+    else:
+        images = [("合成截图", synthetic_screenshot())]
+
+    engine = OCR_identify.get_engine()
+    engine.warmup(args.lang)
+    print(f"OCR引擎: {engine.name} | 语言: {args.lang}")
+    print(f"{'图片':<16}{'像素减少':>8}{'裁剪(ms)':>10}{'原图OCR(ms)':>13}{'裁剪后OCR(ms)':>15}"
+          f"{'节省(ms)':>10}{'预计节省(ms)':>14}{'词数':>10}{'杂词':>8}")
+    for name, img in images:
+        start = time.perf_counter()
+        cropped, info = OCR_identify.auto_crop_image(img)
+        crop_time = time.perf_counter() - start
+
+        full_time, full_words, full_junk = ocr_words(engine, img, args.lang)
+        crop_ocr_time, crop_words, crop_junk = ocr_words(engine, cropped, args.lang)
+        reduction = info["pixel_reduction"]
+        estimated = crop_ocr_time * reduction / max(1 - reduction, 0.01)
+        print(f"{name:<16}{reduction:>8.0%}{crop_time * 1000:>10.1f}{full_time * 1000:>13.0f}"
+              f"{crop_ocr_time * 1000:>15.0f}{(full_time - crop_ocr_time - crop_time) * 1000:>10.0f}"
+              f"{estimated * 1000:>14.0f}{f'{full_words}->{crop_words}':>10}{f'{full_junk}->{crop_junk}':>8}")
+
+
+if __name__ == "__main__":
+    main()
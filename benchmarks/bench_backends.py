@@ -0,0 +1,91 @@
+"""
+对比不同推理后端的生成速度和内存占用
+每个后端在独立子进程中测试，避免相互影响内存统计
+
+用法: python benchmarks/bench_backends.py [--backends cpu cpu-int8 cuda] [--runs 3] [--max-new-tokens 128]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PROMPT = "请帮我解决以下问题：\n 阅读下面的句子，判断其中是否有语病并说明理由：通过这次活动，使我们认识到了环境保护的重要性。"
+
+
+def resident_memory_mb():
+    """当前进程常驻内存(MB)"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024 / 1024
+    except ImportError:
+        import resource
+        # Linux下ru_maxrss单位为KB，这里得到的是峰值
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_backend(backend, runs, max_new_tokens):
+    """子进程: 测试单个后端，以一行JSON输出结果"""
+    import llm
+
+    start = time.perf_counter()
+    model, tokenizer = llm.load_model(llm.MODEL_PATH, backend=backend)
+    load_time = time.perf_counter() - start
+
+    # 预热一次，排除首次调用的额外开销
+    llm.get_response(model, tokenizer, PROMPT, max_new_tokens=8)
+
+    results = []
+    for _ in range(runs):
+        stats = {}
+        llm.get_response(model, tokenizer, PROMPT, max_new_tokens=max_new_tokens, stats=stats)
+        results.append(stats)
+
+    print(json.dumps({
+        "backend": backend,
+        "load_time": load_time,
+        "ttft": sum(r["ttft"] or 0 for r in results) / runs,
+        "tokens_per_s": sum(r["tokens_per_s"] for r in results) / runs,
+        "rss_mb": resident_memory_mb(),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="推理后端基准测试")
+    parser.add_argument("--backends", nargs="+", default=["cpu", "cpu-int8", "cuda"])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_backend(args.child, args.runs, args.max_new_tokens)
+        return
+
+    rows = []
+    for backend in args.backends:
+        print(f"正在测试后端: {backend} ......")
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", backend,
+             "--runs", str(args.runs), "--max-new-tokens", str(args.max_new_tokens)],
+            capture_output=True, text=True, cwd=ROOT
+        )
+        lines = [line for line in proc.stdout.splitlines() if line.startswith("{")]
+        if proc.returncode != 0 or not lines:
+            print(f"⚠️ 后端 {backend} 测试失败: {proc.stderr.strip().splitlines()[-1:]}")
+            continue
+        rows.append(json.loads(lines[-1]))
+
+    print("\n======推理后端对比======")
+    print(f"{'后端':<10}{'加载(s)':>10}{'首token(s)':>12}{'tokens/s':>10}{'内存(MB)':>10}")
+    for row in rows:
+        print(f"{row['backend']:<10}{row['load_time']:>10.1f}{row['ttft']:>12.2f}"
+              f"{row['tokens_per_s']:>10.1f}{row['rss_mb']:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
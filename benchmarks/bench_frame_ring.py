@@ -0,0 +1,142 @@
+"""
+帧读取基准测试：用合成的rawvideo管道代替FFmpeg输出
+1. 吞吐量：对比旧实现(bytearray逐块拼接 + bytes复制 + frombuffer)与预分配缓冲环(readinto直接写入)
+2. 帧龄：管道按固定帧率输出、读者每帧耗时较长(OCR/推理)时，对比fifo与latest两种交付方式的帧龄和丢帧
+
+用法: python benchmarks/bench_frame_ring.py [--frames 120] [--width 1080] [--height 2400] [--fps 30] [--consumer-ms 80]
+"""
+import argparse
+import importlib.util
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 文件名带方括号，无法直接import
+spec = importlib.util.spec_from_file_location("read_screen", os.path.join(ROOT, "[developing]read_screen.py"))
+read_screen = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(read_screen)
+
+# 子进程：向stdout写入frames帧(fps>0时按该帧率)，每帧内容不同，写完后等待被结束(不产生EOF)
+WRITER = """
+import sys, time
+frame_size, frames, fps = int(sys.argv[1]), int(sys.argv[2]), float(sys.argv[3])
+base = bytes(range(256)) * (frame_size // 256 + 1)
+out = sys.stdout.buffer
+start = time.perf_counter()
+for i in range(frames):
+    if fps > 0:
+        time.sleep(max(0.0, start + i / fps - time.perf_counter()))
+    out.write(base[i % 256:i % 256 + frame_size])
+out.flush()
+time.sleep(3600)
+"""
+
+
+def start_writer(frame_size, frames, fps=0):
+    return subprocess.Popen([sys.executable, "-c", WRITER, str(frame_size), str(frames), str(fps)],
+                            stdout=subprocess.PIPE, bufsize=0)
+
+
+def reference_reader(stdout, frame_size, frame_queue, frames):
+    """旧实现：逐块拼接bytearray，再复制成bytes放入队列"""
+    for _ in range(frames):
+        raw_frame = bytearray()
+        while len(raw_frame) < frame_size:
+            chunk = stdout.read(frame_size - len(raw_frame))
+            if not chunk:
+                return
+            raw_frame.extend(chunk)
+        frame_queue.put(bytes(raw_frame))
+
+
+def bench_reference(width, height, frames):
+    frame_size = width * height * 3
+    writer = start_writer(frame_size, frames)
+    frame_queue = queue.Queue(maxsize=read_screen.BUFFERED_FRAMES)
+    start = time.perf_counter()
+    threading.Thread(target=reference_reader, args=(writer.stdout, frame_size, frame_queue, frames),
+                     daemon=True).start()
+    checksum = 0
+    for _ in range(frames):
+        frame = np.frombuffer(frame_queue.get(), dtype=np.uint8).reshape((height, width, 3))
+        checksum += int(frame[0, 0, 0])
+    elapsed = time.perf_counter() - start
+    writer.kill()
+    return elapsed, checksum
+
+
+def bench_ring(width, height, frames):
+    frame_size = width * height * 3
+    writer = start_writer(frame_size, frames)
+    # 逐帧校验内容，使用不丢帧的fifo方式
+    pipeline = read_screen.VideoPipeline((width, height), delivery_mode="fifo")
+    pipeline.ffmpeg_proc = writer
+    pipeline.running = True
+    pipeline.last_frame_time = time.time()
+    start = time.perf_counter()
+    threading.Thread(target=pipeline.frame_reader, daemon=True).start()
+    checksum = 0
+    for _ in range(frames):
+        frame = pipeline.get_frame(timeout=10)
+        checksum += int(frame[0, 0, 0])
+    elapsed = time.perf_counter() - start
+    pipeline.running = False
+    writer.kill()
+    return elapsed, checksum
+
+
+def bench_latency(mode, width, height, frames, fps, consumer_ms):
+    """慢读者：每取一帧后模拟consumer_ms的处理，统计交付帧的帧龄"""
+    frame_size = width * height * 3
+    writer = start_writer(frame_size, frames, fps)
+    pipeline = read_screen.VideoPipeline((width, height), delivery_mode=mode)
+    pipeline.ffmpeg_proc = writer
+    pipeline.running = True
+    pipeline.last_frame_time = time.time()
+    threading.Thread(target=pipeline.frame_reader, daemon=True).start()
+    deadline = time.perf_counter() + frames / fps
+    while time.perf_counter() < deadline:
+        if pipeline.get_frame(timeout=10) is None:
+            break
+        time.sleep(consumer_ms / 1000)
+    pipeline.running = False
+    writer.kill()
+    return pipeline
+
+
+def main():
+    parser = argparse.ArgumentParser(description="帧读取基准测试")
+    parser.add_argument("--frames", type=int, default=120)
+    parser.add_argument("--width", type=int, default=1080)
+    parser.add_argument("--height", type=int, default=2400)
+    parser.add_argument("--fps", type=float, default=30, help="帧龄测试中管道的输出帧率")
+    parser.add_argument("--consumer-ms", type=float, default=80, help="帧龄测试中读者每帧的处理耗时")
+    args = parser.parse_args()
+
+    frame_mb = args.width * args.height * 3 / 1e6
+    print(f"分辨率: {args.width}x{args.height} | 每帧 {frame_mb:.1f} MB | 帧数: {args.frames}")
+    print(f"{'实现':<24}{'耗时(s)':>10}{'帧/s':>10}{'MB/s':>10}")
+    results = {}
+    for name, bench in [("旧实现(bytearray+bytes)", bench_reference), ("缓冲环(readinto)", bench_ring)]:
+        elapsed, checksum = bench(args.width, args.height, args.frames)
+        results[name] = checksum
+        fps = args.frames / elapsed
+        print(f"{name:<24}{elapsed:>10.2f}{fps:>10.1f}{fps * frame_mb:>10.0f}")
+    assert len(set(results.values())) == 1, "两种实现读到的帧内容不一致"
+    print("结果校验通过：两种实现读到的帧内容一致")
+
+    print(f"\n帧龄测试: 管道 {args.fps:.0f} fps | 读者每帧处理 {args.consumer_ms:.0f}ms")
+    for mode in ("fifo", "latest"):
+        pipeline = bench_latency(mode, args.width, args.height, args.frames, args.fps, args.consumer_ms)
+        print(f"{mode:<8}{pipeline.format_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+布局分析(get_dynamic_gap / reorganize_paragraph)基准测试
+用合成的Tesseract输出字典对比逐词循环的旧实现与NumPy列实现，并校验两者结果一致
+
+用法: python benchmarks/bench_layout.py [--words 5000] [--repeat 20]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import OCR_identify
+
+
+# ==================== 旧实现(逐词循环)，作为对照 ====================
+def reference_get_dynamic_gap(data, img_size):
+    heights = []
+    line_gaps = []
+    prev_bottom = None
+    for i in range(len(data['text'])):
+        if not data['text'][i].strip() or int(data['conf'][i]) < 10:
+            continue
+        height = data['height'][i]
+        top = data['top'][i]
+        bottom = top + height
+        heights.append(height)
+        if prev_bottom is not None:
+            gap = top - prev_bottom
+            if 0 < gap < img_size[1] * 0.2:
+                line_gaps.append(gap)
+        prev_bottom = bottom
+
+    def filter_outliers(values, m=2):
+        if not values:
+            return values
+        median = np.median(values)
+        return [x for x in values if abs(x - median) < m * np.std(values)]
+
+    filtered_heights = filter_outliers(heights)
+    filtered_gaps = filter_outliers(line_gaps)
+    avg_height = np.mean(filtered_heights) if filtered_heights else img_size[1] * 0.02
+    median_gap = np.median(filtered_gaps) if filtered_gaps else avg_height * 1.2
+    density = len(data['text']) / (img_size[0] * img_size[1]) if img_size[0] * img_size[1] > 0 else 0
+    density_weight = 1.5 + (0.5 / (1 + np.exp(-10 * (density - 0.001))))
+    paragraph_threshold = max(median_gap * density_weight, avg_height * 2.3, img_size[1] * 0.03)
+    line_spacing_threshold = min(max(avg_height * 0.8, median_gap * 0.7), avg_height * 1.2)
+    return paragraph_threshold, line_spacing_threshold
+
+
+def reference_reorganize_paragraph(data, lang, img_size, dconf, dynamic_gap=False):
+    paragraphs = []
+    current_para = []
+    current_conf = []
+    prev_bottom = None
+    if dynamic_gap:
+        para_thresh, line_thresh = reference_get_dynamic_gap(data, img_size)
+    for i in range(len(data['text'])):
+        text = data['text'][i]
+        conf = int(data['conf'][i])
+        if conf < dconf or not text.strip():
+            continue
+        top, height = data['top'][i], data['height'][i]
+        bottom = top + height
+        if prev_bottom is not None:
+            line_gap = top - prev_bottom
+            paragraph_threshold = 2 * line_thresh if dynamic_gap else height * 3
+            if line_gap > paragraph_threshold and current_para:
+                if sum(current_conf) / len(current_conf) >= 30:
+                    paragraphs.append(''.join(current_para) if lang == 'chi_sim' else ' '.join(current_para))
+                current_para = []
+                current_conf = []
+        current_para.append(text.strip())
+        current_conf.append(conf)
+        prev_bottom = bottom
+    if current_para and sum(current_conf) / len(current_conf) >= 30:
+        paragraphs.append(''.join(current_para) if lang == 'chi_sim' else ' '.join(current_para))
+    return paragraphs
+
+
+# ==================== 合成数据 ====================
+def synthetic_data(num_words, seed=0):
+    """按行排布的合成OCR字典，包含空词、低置信度词、段落间距和换行"""
+    rng = random.Random(seed)
+    data = {key: [] for key in ('text', 'conf', 'left', 'top', 'width', 'height')}
+    top, left = 10, 10
+    for _ in range(num_words):
+        if rng.random() < 0.1:
+            text, conf = "", -1
+        else:
+            text = rng.choice(["题目", "阅读", "下列", "answer", "的", "A.", "选项", " 空格 "])
+            conf = rng.choice([rng.randint(0, 30), rng.randint(60, 96)])
+        height = rng.randint(18, 24)
+        data['text'].append(text)
+        data['conf'].append(conf)
+        data['left'].append(left)
+        data['top'].append(top)
+        data['width'].append(20)
+        data['height'].append(height)
+        left += 25
+        if left > 1000:
+            left = 10
+            # 偶尔出现较大的段落间距
+            top += height + (rng.randint(70, 120) if rng.random() < 0.15 else rng.randint(4, 10))
+    img_size = (1080, top + 40)
+    return data, img_size
+
+
+def best_time(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="布局分析基准测试")
+    parser.add_argument("--words", type=int, nargs="+", default=[500, 2000, 5000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'词数':>8}{'函数':>24}{'旧实现(ms)':>12}{'新实现(ms)':>12}{'加速':>8}")
+    for num_words in args.words:
+        data, img_size = synthetic_data(num_words)
+
+        for dynamic_gap in (False, True):
+            expected = reference_reorganize_paragraph(data, 'chi_sim+eng', img_size, 8, dynamic_gap)
+            actual = OCR_identify.reorganize_paragraph(data, 'chi_sim+eng', img_size, 8, dynamic_gap)
+            assert expected == actual, "reorganize_paragraph结果与旧实现不一致"
+        assert np.allclose(reference_get_dynamic_gap(data, img_size),
+                           OCR_identify.get_dynamic_gap(data, img_size)), "get_dynamic_gap结果与旧实现不一致"
+
+        cases = [
+            ("get_dynamic_gap",
+             lambda: reference_get_dynamic_gap(data, img_size),
+             lambda: OCR_identify.get_dynamic_gap(data, img_size)),
+            ("reorganize_paragraph",
+             lambda: reference_reorganize_paragraph(data, 'chi_sim+eng', img_size, 8, True),
+             lambda: OCR_identify.reorganize_paragraph(data, 'chi_sim+eng', img_size, 8, True)),
+        ]
+        for name, old, new in cases:
+            old_time = best_time(old, args.repeat)
+            new_time = best_time(new, args.repeat)
+            print(f"{num_words:>8}{name:>24}{old_time * 1000:>12.2f}{new_time * 1000:>12.2f}"
+                  f"{old_time / new_time:>7.1f}x")
+
+    print("结果校验通过：新旧实现输出一致")
+
+
+if __name__ == "__main__":
+    main()
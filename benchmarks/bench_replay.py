@@ -0,0 +1,138 @@
+"""
+回放基准测试：用capture.ReplayCapture回放录屏或截图文件夹，在无桌面环境下跑通 捕获→OCR→解答 的完整流程
+与main.py使用相同的组件和参数：FrameChangeDetector判断画面变化，OCR_identify.identify_question识别题目
+(自动裁剪、OCR缓存)，llm.build_question_prefix构造共享前缀(前缀KV缓存)，AnswerCache缓存答案
+输出各阶段耗时，也可以把识别结果写入JSONL做回归对比
+
+用法: python benchmarks/bench_replay.py 录屏.mp4|截图目录 [--fps 5] [--roi 0.05 0.2 0.95 0.6] [--answer]
+      [--description 题干] [--output out.jsonl] [--no-cache] [--answer-cache answer_cache.db]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import capture
+import OCR_identify
+from answer_cache import AnswerCache
+from src import FrameChangeDetector
+
+
+def crop_normalized(frame, roi):
+    """按归一化坐标(x0, y0, x1, y1)裁剪"""
+    if roi is None:
+        return frame
+    height, width = frame.shape[:2]
+    x0, y0, x1, y1 = roi
+    return frame[int(y0 * height):int(y1 * height), int(x0 * width):int(x1 * width)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回放基准测试")
+    parser.add_argument("source", help="录屏文件、截图文件夹或通配符")
+    parser.add_argument("--fps", type=float, default=None, help="回放帧率，默认视频自身帧率/图片1帧每秒")
+    parser.add_argument("--roi", type=float, nargs=4, default=None, help="题目区域的归一化坐标 x0 y0 x1 y1")
+    parser.add_argument("--answer", action="store_true", help="把识别出的题目交给模型解答")
+    parser.add_argument("--description", default=None, help="题干，作为共享前缀(与main.py按'i'录入的题干相同)")
+    parser.add_argument("--max-new-tokens", type=int, default=256)
+    parser.add_argument("--prompt-lookup", action="store_true", help="使用提示词查找解码")
+    parser.add_argument("--no-auto-crop", action="store_true", help="关闭OCR前的自动裁剪")
+    parser.add_argument("--no-cache", action="store_true", help="关闭OCR缓存和答案缓存，测量不命中时的耗时")
+    parser.add_argument("--answer-cache", default=":memory:",
+                        help="答案缓存的SQLite路径，默认只在本次回放内有效；指定answer_cache.db时与main.py共用")
+    parser.add_argument("--output", help="逐个变化画面写入JSONL(题目、答案、耗时)")
+    args = parser.parse_args()
+
+    engine = None
+    answer_cache = None
+    if args.answer:
+        import llm
+        from llm_client import connect_or_load
+        engine = connect_or_load()
+        engine.wait()
+        answer_cache = AnswerCache(args.answer_cache)
+        settings = llm.generation_settings(engine.backend, args.max_new_tokens, args.prompt_lookup)
+        prefix = llm.build_question_prefix(args.description)
+
+    camera = capture.create_capture("replay", source=args.source, fps=args.fps, loop=False)
+    camera.start()
+    detector = FrameChangeDetector()
+    out = open(args.output, "w", encoding="utf-8") if args.output else None
+
+    frames = changed = 0
+    totals = {"capture": 0.0, "ocr": 0.0, "answer": 0.0}
+    ocr_hits = answer_hits = 0
+    start_time = time.perf_counter()
+    try:
+        while True:
+            stage_start = time.perf_counter()
+            frame = camera.get_latest_frame()
+            totals["capture"] += time.perf_counter() - stage_start
+            if frame is None:
+                break
+            frames += 1
+
+            # 与main.py相同，只处理变化的画面
+            if not detector.is_changed(frame):
+                continue
+            changed += 1
+
+            ocr_stats = {}
+            stage_start = time.perf_counter()
+            question = OCR_identify.identify_question(crop_normalized(frame, args.roi),
+                                                      auto_crop=not args.no_auto_crop,
+                                                      use_cache=not args.no_cache, stats=ocr_stats)
+            ocr_time = time.perf_counter() - stage_start
+            totals["ocr"] += ocr_time
+            ocr_hits += ocr_stats["cache_hit"]
+            record = {"frame": frames, "question": question, "ocr": round(ocr_time, 4),
+                      "ocr_cache_hit": ocr_stats["cache_hit"]}
+            if "crop" in ocr_stats:
+                record["pixel_reduction"] = round(ocr_stats["crop"]["pixel_reduction"], 3)
+
+            if engine is not None and question:
+                stage_start = time.perf_counter()
+                cache_key = AnswerCache.make_key(question, args.description or "None", settings)
+                answer = None if args.no_cache else answer_cache.get(cache_key)
+                record["answer_cache_hit"] = answer is not None
+                if answer is None:
+                    gen_stats = {}
+                    answer = "".join(engine.stream_response(prefix + question, max_new_tokens=args.max_new_tokens,
+                                                            stats=gen_stats, prompt_prefix=prefix,
+                                                            prompt_lookup=args.prompt_lookup))
+                    answer_cache.put(cache_key, question, answer)
+                    record.update(ttft=gen_stats.get("ttft"), cached_tokens=gen_stats.get("cached_tokens"))
+                else:
+                    answer_hits += 1
+                record["answer"] = answer
+                record["generate"] = round(time.perf_counter() - stage_start, 4)
+                totals["answer"] += record["generate"]
+
+            print(f"帧 {frames}: OCR {ocr_time * 1000:.0f}ms{'(缓存)' if ocr_stats['cache_hit'] else ''} | "
+                  f"{question[:60]}")
+            if out is not None:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+    finally:
+        camera.stop()
+        camera.close()
+        if out is not None:
+            out.close()
+        if answer_cache is not None:
+            answer_cache.close()
+
+    elapsed = time.perf_counter() - start_time
+    print(f"\n回放帧数: {frames} | 变化画面: {changed} | 总耗时: {elapsed:.2f}s")
+    if changed:
+        print(f"取帧等待: {totals['capture']:.2f}s | 平均OCR: {totals['ocr'] / changed * 1000:.0f}ms"
+              f" | OCR缓存命中: {ocr_hits}"
+              + (f" | 平均解答: {totals['answer'] / changed:.2f}s | 答案缓存命中: {answer_hits}"
+                 if engine is not None else ""))
+    print(detector.format_stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+框选拖动重绘基准测试：模拟一次拖动中的鼠标移动事件
+对比旧实现(每次移动复制整帧再画框)与ROISelector(只恢复上一次画框的边框条带)，并校验显示结果一致
+
+用法: python benchmarks/bench_roi_overlay.py [--width 1080] [--height 2400] [--moves 300]
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src import ROISelector
+
+
+def drag_path(width, height, moves):
+    """从左上附近拖到右下附近，中途来回晃动"""
+    xs = np.linspace(width * 0.1, width * 0.9, moves) + np.sin(np.arange(moves) / 5) * width * 0.05
+    ys = np.linspace(height * 0.1, height * 0.6, moves)
+    return [(int(x), int(y)) for x, y in zip(xs, ys)]
+
+
+def reference_drag(image, start, path):
+    """旧实现：每次鼠标移动都复制整帧"""
+    clone = image
+    for x, y in path:
+        temp = image.copy()
+        cv2.rectangle(temp, start, (x, y), (0, 255, 0), 2)
+        clone = temp
+    return clone
+
+
+def selector_drag(selector, start, path):
+    selector._mouse_callback(cv2.EVENT_LBUTTONDOWN, *start, 0, None)
+    for x, y in path:
+        selector._mouse_callback(cv2.EVENT_MOUSEMOVE, x, y, 0, None)
+    return selector.clone
+
+
+def main():
+    parser = argparse.ArgumentParser(description="框选拖动重绘基准测试")
+    parser.add_argument("--width", type=int, default=1080)
+    parser.add_argument("--height", type=int, default=2400)
+    parser.add_argument("--moves", type=int, default=300)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, (args.height, args.width, 3), dtype=np.uint8)
+    start = (args.width // 10, args.height // 10)
+    path = drag_path(args.width, args.height, args.moves)
+
+    begin = time.perf_counter()
+    expected = reference_drag(image, start, path)
+    old_time = time.perf_counter() - begin
+
+    selector = ROISelector(image, multi=True)
+    begin = time.perf_counter()
+    actual = selector_drag(selector, start, path)
+    new_time = time.perf_counter() - begin
+
+    assert np.array_equal(expected, actual), "拖动后的显示图像与旧实现不一致"
+    assert np.array_equal(selector.base, image), "原图被修改"
+
+    print(f"图像: {args.width}x{args.height} | 鼠标移动: {args.moves}次")
+    print(f"旧实现(整帧复制): {old_time / args.moves * 1000:.3f} ms/次")
+    print(f"ROISelector(边框条带): {new_time / args.moves * 1000:.3f} ms/次 ({old_time / new_time:.1f}x)")
+    print("结果校验通过：显示图像与旧实现一致")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+"""
+屏幕捕获后端
+所有后端接口相同(与dxcam的摄像头对象一致)，main.py可以在不同平台之间切换:
+    start(region=None, target_fps=60)  开始捕获，region为(left, top, right, bottom)
+    get_latest_frame()                 阻塞到有新帧为止，返回RGB的numpy数组，超时返回None
+    stop()                             停止捕获
+
+    dxcam   Windows桌面复制(DXGI)
+    mss     跨平台截屏，Linux(X11)上使用
+    ffmpeg  FFmpeg rawvideo管道，默认抓取桌面(x11grab/gdigrab)，也可以接scrcpy录制流
+    replay  回放录制的视频或图片文件夹，无桌面环境下测试完整的捕获→OCR→解答流程
+"""
+import glob
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+try:
+    import mss
+except ImportError:
+    mss = None
+
+FFMPEG_PATH = os.environ.get("FFMPEG_PATH", "ffmpeg")
+FFPROBE_PATH = os.environ.get("FFPROBE_PATH", "ffprobe")
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+
+class DxcamCapture:
+    """dxcam的薄封装，仅Windows可用"""
+    name = "dxcam"
+
+    def __init__(self, **kwargs):
+        import dxcam
+        self.camera = dxcam.create(**kwargs)
+
+    def start(self, region=None, target_fps=60):
+        self.camera.start(region=region, target_fps=target_fps)
+
+    def get_latest_frame(self):
+        return self.camera.get_latest_frame()
+
+    def stop(self):
+        self.camera.stop()
+
+
+class _FramePacer:
+    """按目标帧率等待，模拟dxcam视频模式下get_latest_frame阻塞到下一帧的行为"""
+
+    def __init__(self, target_fps):
+        self.interval = 1.0 / target_fps if target_fps else 0.0
+        self.next_time = time.perf_counter()
+
+    def wait(self):
+        delay = self.next_time - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        # 落后太多时不补帧
+        self.next_time = max(self.next_time + self.interval, time.perf_counter())
+
+
+class MssCapture:
+    """用mss按需截取屏幕区域，Linux(X11)/macOS/Windows通用"""
+    name = "mss"
+
+    def __init__(self):
+        if mss is None:
+            raise ImportError("未安装mss")
+        self._local = threading.local()  # mss实例不能跨线程使用
+        self.monitor = None
+        self.pacer = None
+
+    def _grabber(self):
+        grabber = getattr(self._local, "grabber", None)
+        if grabber is None:
+            grabber = self._local.grabber = mss.mss()
+        return grabber
+
+    def start(self, region=None, target_fps=60):
+        if region is None:
+            self.monitor = self._grabber().monitors[1]  # 主屏幕
+        else:
+            left, top, right, bottom = region
+            self.monitor = {"left": left, "top": top, "width": right - left, "height": bottom - top}
+        self.pacer = _FramePacer(target_fps)
+
+    def get_latest_frame(self):
+        if self.monitor is None:
+            self.start()
+        self.pacer.wait()
+        shot = self._grabber().grab(self.monitor)
+        return cv2.cvtColor(np.asarray(shot), cv2.COLOR_BGRA2RGB)
+
+    def stop(self):
+        self.monitor = None
+
+
+class FFmpegPipeCapture:
+    """
+    从FFmpeg的rawvideo(rgb24)输出读取帧
+    读取线程用readinto写入三个预分配缓冲区轮流使用，总是交付最新帧，交给调用方的缓冲区在下一次取帧前不会被覆盖
+    """
+    name = "ffmpeg"
+
+    def __init__(self, input_args=None, source_cmd=None, frame_size=None, ffmpeg_path=FFMPEG_PATH,
+                 ffprobe_path=FFPROBE_PATH, timeout=1.0):
+        """
+        :param input_args: FFmpeg输入参数，None时按平台抓取桌面上的region区域，未指定region时抓取整个桌面
+        :param source_cmd: 上游命令，其标准输出作为FFmpeg的输入(如scrcpy --record=-，配合input_args=["-f", "matroska", "-i", "-"])
+        :param frame_size: start时不给region时的输出帧(宽, 高)；抓取整个桌面时默认用ffprobe获取
+        :param timeout: get_latest_frame等待新帧的超时(s)
+        """
+        self.input_args = input_args
+        self.source_cmd = source_cmd
+        self.frame_size = frame_size
+        self.ffmpeg_path = ffmpeg_path
+        self.ffprobe_path = ffprobe_path
+        self.timeout = timeout
+        self.source_proc = None
+        self.ffmpeg_proc = None
+        self.running = False
+        self.buffers = []
+        self._cond = threading.Condition()
+        self._latest = None  # 最新完整帧所在的缓冲区
+        self._held = None    # 上一次交给调用方的缓冲区
+        self._seq = 0
+        self._delivered_seq = 0
+
+    def probe_frame_size(self, input_args):
+        """用ffprobe读取输入的画面(宽, 高)，抓取整个桌面时确定帧大小"""
+        cmd = [self.ffprobe_path, "-v", "error"] + input_args + \
+              ["-select_streams", "v:0", "-show_entries", "stream=width,height", "-of", "csv=p=0"]
+        try:
+            output = subprocess.run(cmd, capture_output=True, text=True, timeout=10, check=True).stdout
+            width, height = (int(value) for value in output.split()[0].split(",")[:2])
+        except (OSError, subprocess.SubprocessError, ValueError, IndexError) as e:
+            raise RuntimeError(f"无法获取桌面尺寸，请指定region或frame_size({' '.join(cmd)}): {e}") from e
+        return width, height
+
+    def _build_command(self, region, target_fps):
+        if self.input_args is None:
+            if sys.platform.startswith("win"):
+                input_args = ["-f", "gdigrab", "-framerate", str(target_fps)]
+                source = "desktop"
+            else:
+                input_args = ["-f", "x11grab", "-framerate", str(target_fps)]
+                source = os.environ.get("DISPLAY", ":0")
+            if region is None:
+                # 不指定-video_size和偏移时抓取整个桌面
+                input_args += ["-i", source]
+                width, height = self.frame_size or self.probe_frame_size(input_args)
+            else:
+                left, top, right, bottom = region
+                width, height = right - left, bottom - top
+                if sys.platform.startswith("win"):
+                    input_args += ["-offset_x", str(left), "-offset_y", str(top),
+                                   "-video_size", f"{width}x{height}", "-i", source]
+                else:
+                    input_args += ["-video_size", f"{width}x{height}", "-i", f"{source}+{left},{top}"]
+            filters = []
+        else:
+            input_args = list(self.input_args)
+            if region is not None:
+                left, top, right, bottom = region
+                width, height = right - left, bottom - top
+                filters = ["-vf", f"crop={width}:{height}:{left}:{top}"]
+            elif self.frame_size is not None:
+                width, height = self.frame_size
+                filters = []
+            else:
+                raise ValueError("未指定region时需要frame_size")
+        cmd = [self.ffmpeg_path, "-loglevel", "error"] + input_args + filters + \
+              ["-r", str(target_fps), "-f", "rawvideo", "-pix_fmt", "rgb24", "-"]
+        return cmd, (height, width, 3)
+
+    def start(self, region=None, target_fps=60):
+        cmd, shape = self._build_command(region, target_fps)
+        self.buffers = [np.empty(shape, dtype=np.uint8) for _ in range(3)]
+        self._latest = self._held = None
+
+        stdin = None
+        if self.source_cmd is not None:
+            self.source_proc = subprocess.Popen(self.source_cmd, stdout=subprocess.PIPE, bufsize=0)
+            stdin = self.source_proc.stdout
+        self.ffmpeg_proc = subprocess.Popen(cmd, stdin=stdin, stdout=subprocess.PIPE, bufsize=0)
+        self.running = True
+        threading.Thread(target=self._reader, daemon=True).start()
+
+    def _reader(self):
+        stdout = self.ffmpeg_proc.stdout
+        write_slot = 0
+        while self.running:
+            view = memoryview(self.buffers[write_slot]).cast('B')
+            filled = 0
+            while filled < len(view) and self.running:
+                count = stdout.readinto(view[filled:])
+                if not count:
+                    break
+                filled += count
+            if filled < len(view):
+                # 流已结束
+                self.running = False
+                break
+            with self._cond:
+                self._latest = write_slot
+                self._seq += 1
+                # 下一帧写入既不是最新帧、也不在调用方手中的缓冲区
+                write_slot = next(slot for slot in range(3) if slot not in (self._latest, self._held))
+                self._cond.notify_all()
+        with self._cond:
+            self._cond.notify_all()
+
+    def get_latest_frame(self):
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > self._delivered_seq or not self.running,
+                                       timeout=self.timeout):
+                return None
+            if self._seq == self._delivered_seq:
+                return None
+            self._delivered_seq = self._seq
+            self._held = self._latest
+            return self.buffers[self._held]
+
+    def stop(self):
+        self.running = False
+        for proc in (self.ffmpeg_proc, self.source_proc):
+            if proc and proc.poll() is None:
+                proc.terminate()
+                try:
+                    proc.wait(timeout=2)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+        self.ffmpeg_proc = self.source_proc = None
+
+
+class ReplayCapture:
+    """
+    按指定帧率回放录制的视频或图片文件夹(按文件名排序)
+    region落在画面内时裁剪该区域，否则返回整帧
+    """
+    name = "replay"
+
+    def __init__(self, source, fps=None, loop=True):
+        """
+        :param source: 视频文件、图片文件夹或通配符
+        :param fps: 回放帧率，None时视频使用自身帧率、图片使用1帧/s
+        :param loop: 播放完后是否从头循环，否则之后get_latest_frame返回None
+        """
+        self.source = source
+        self.loop = loop
+        self.paths = None
+        self.video = None
+        if os.path.isdir(source):
+            self.paths = sorted(p for p in glob.glob(os.path.join(source, "*")) if p.lower().endswith(IMAGE_EXTENSIONS))
+        elif glob.has_magic(source):
+            self.paths = sorted(glob.glob(source))
+        if self.paths is not None:
+            if not self.paths:
+                raise FileNotFoundError(f"找不到可回放的图片: {source}")
+            self.fps = fps or 1.0
+        else:
+            self.video = cv2.VideoCapture(source)
+            if not self.video.isOpened():
+                raise FileNotFoundError(f"无法打开视频: {source}")
+            self.fps = fps or self.video.get(cv2.CAP_PROP_FPS) or 30.0
+        self.region = None
+        self.pacer = None
+        self.index = 0
+        self.finished = False
+
+    def start(self, region=None, target_fps=None):
+        """target_fps不影响回放帧率(由fps决定)，保留参数以兼容其他后端"""
+        self.region = region
+        self.pacer = _FramePacer(self.fps)
+
+    def _next_image(self):
+        if self.paths is not None:
+            if self.index >= len(self.paths):
+                if not self.loop:
+                    return None
+                self.index = 0
+            image = cv2.imread(self.paths[self.index])
+            self.index += 1
+            return image
+
+        ok, image = self.video.read()
+        if not ok:
+            if not self.loop:
+                return None
+            self.video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, image = self.video.read()
+        self.index += 1
+        return image if ok else None
+
+    def get_latest_frame(self):
+        if self.finished:
+            return None
+        if self.pacer is None:
+            self.start()
+        self.pacer.wait()
+        image = self._next_image()
+        if image is None:
+            self.finished = True
+            return None
+        frame = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        if self.region is not None:
+            left, top, right, bottom = self.region
+            if right <= frame.shape[1] and bottom <= frame.shape[0]:
+                frame = frame[top:bottom, left:right]
+        return frame
+
+    def stop(self):
+        self.pacer = None
+
+    def close(self):
+        if self.video is not None:
+            self.video.release()
+
+
+BACKENDS = ("auto", "dxcam", "mss", "ffmpeg", "replay")
+
+
+def create_capture(name="auto", **kwargs):
+    """
+    创建捕获后端
+    :param name: auto(Windows用dxcam，其他平台优先mss，未安装时用ffmpeg) / dxcam / mss / ffmpeg / replay
+    :param kwargs: 传给后端构造函数的参数(replay需要source)
+    """
+    if name == "auto":
+        if sys.platform.startswith("win"):
+            name = "dxcam"
+        else:
+            name = "mss" if mss is not None else "ffmpeg"
+    if name == "dxcam":
+        return DxcamCapture(**kwargs)
+    if name == "mss":
+        return MssCapture(**kwargs)
+    if name == "ffmpeg":
+        return FFmpegPipeCapture(**kwargs)
+    if name == "replay":
+        return ReplayCapture(**kwargs)
+    raise ValueError(f"未知的捕获后端: {name}，可选: {BACKENDS}")
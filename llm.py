@@ -0,0 +1,775 @@
+import copy
+import os
+import re
+import time
+import torch
+from threading import Thread, Lock, Event
+from transformers import (AutoModelForCausalLM, AutoTokenizer, TextIteratorStreamer, DynamicCache,
+                          StoppingCriteria, StoppingCriteriaList)
+
+MODEL_PATH = "./Qwen1.5-1.8B-Chat"
+SYSTEM_PROMPT = "You are a helpful assistant."
+
+# 推理后端: auto(自动选择) / cuda / cpu(fp32) / cpu-int8(int8动态量化)
+BACKENDS = ("auto", "cuda", "cpu", "cpu-int8")
+DEFAULT_BACKEND = os.environ.get("QWEN_BACKEND", "auto")
+
+
+def select_backend(backend=DEFAULT_BACKEND):
+    """
+    根据硬件选择推理后端，没有GPU时回退到CPU int8量化
+    :param backend: BACKENDS中的一项
+    :return: 实际使用的后端名
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"未知的推理后端: {backend}，可选: {', '.join(BACKENDS)}")
+    if backend == "auto":
+        return "cuda" if torch.cuda.is_available() else "cpu-int8"
+    if backend == "cuda" and not torch.cuda.is_available():
+        print("⚠️ 未检测到可用GPU，回退到CPU推理")
+        return "cpu-int8"
+    return backend
+
+
+def configure_cpu_threads(num_threads=None):
+    """
+    设置CPU推理线程数，默认取物理核心数(超线程对矩阵乘法基本没有收益)
+    :return: 实际线程数
+    """
+    if num_threads is None:
+        try:
+            import psutil
+            num_threads = psutil.cpu_count(logical=False)
+        except ImportError:
+            num_threads = None
+        num_threads = num_threads or max(1, (os.cpu_count() or 2) // 2)
+    torch.set_num_threads(num_threads)
+    return num_threads
+
+
+def load_model(model_path=MODEL_PATH, backend=DEFAULT_BACKEND, num_threads=None, **model_kwargs):
+    """
+    按后端加载模型和分词器
+    :param model_path: 模型路径
+    :param backend: BACKENDS中的一项
+    :param num_threads: CPU后端的线程数，None为自动
+    :param model_kwargs: 额外传给from_pretrained的参数
+    :return: (model, tokenizer)
+    """
+    backend = select_backend(backend)
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+
+    if backend == "cuda":
+        kwargs = dict(torch_dtype="auto", device_map="auto")
+        kwargs.update(model_kwargs)
+        model = AutoModelForCausalLM.from_pretrained(model_path, **kwargs)
+    else:
+        threads = configure_cpu_threads(num_threads)
+        # 多数CPU没有高效的半精度矩阵乘法，先以fp32加载
+        kwargs = dict(torch_dtype=torch.float32)
+        kwargs.update(model_kwargs)
+        model = AutoModelForCausalLM.from_pretrained(model_path, **kwargs)
+        if backend == "cpu-int8":
+            # 线性层权重量化为int8，激活在运行时动态量化
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        print(f"CPU推理后端: {backend} | 线程数: {threads}")
+
+    model.eval()
+    return model, tokenizer
+
+
+class ModelLoader:
+    """在后台线程中加载模型和分词器，启动时其它准备工作可以同时进行"""
+
+    def __init__(self, model_path=MODEL_PATH, on_ready=None, backend=DEFAULT_BACKEND, **model_kwargs):
+        """
+        :param model_path: 模型路径
+        :param on_ready: 加载完成后在后台线程中调用 on_ready(model, tokenizer)
+        :param backend: 推理后端，见load_model
+        :param model_kwargs: 传给from_pretrained的参数
+        """
+        self.model_path = model_path
+        self.on_ready = on_ready
+        self.backend = select_backend(backend)
+        self.model_kwargs = model_kwargs
+        self.model = None
+        self.tokenizer = None
+        self.error = None
+        self.start_time = None
+        self.end_time = None
+        self._ready = Event()
+        self._thread = None
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        self._thread = Thread(target=self._load, daemon=True)
+        self._thread.start()
+        return self
+
+    def _load(self):
+        try:
+            self.model, self.tokenizer = load_model(self.model_path, self.backend, **self.model_kwargs)
+            if self.on_ready is not None:
+                self.on_ready(self.model, self.tokenizer)
+        except Exception as e:
+            self.error = e
+            print(f"模型加载失败: {e}")
+        finally:
+            self.end_time = time.perf_counter()
+            self._ready.set()
+
+    def is_ready(self):
+        return self._ready.is_set()
+
+    def wait(self, timeout=None):
+        """
+        等待模型加载完成
+        :return: (model, tokenizer)
+        """
+        if not self._ready.wait(timeout):
+            raise TimeoutError("模型加载超时")
+        if self.error is not None:
+            raise RuntimeError("模型加载失败") from self.error
+        return self.model, self.tokenizer
+
+
+QUESTION_INSTRUCTION = "请帮我解决以下问题：\n "
+
+
+def build_question_prefix(description=None):
+    """提问的共享前缀：固定的指令加上题干，没有题干(None或"None")时只有指令"""
+    if description and description.strip().lower() != "none":
+        return QUESTION_INSTRUCTION + description
+    return QUESTION_INSTRUCTION
+
+
+def generation_settings(backend, max_new_tokens, prompt_lookup=False):
+    """影响答案的生成参数，参与答案缓存的键(见AnswerCache.make_key)"""
+    return {"model": MODEL_PATH, "backend": backend, "system": SYSTEM_PROMPT,
+            "max_new_tokens": max_new_tokens, "prompt_lookup": prompt_lookup}
+
+
+def build_chat_text(tokenizer, input_prompt, history=None):
+    """
+    将用户输入套入Qwen对话模板
+    :param history: 之前的对话消息[{"role": "user"/"assistant", "content": ...}, ...]
+    """
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}] + list(history or []) + \
+               [{"role": "user", "content": input_prompt}]
+
+    return tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+
+
+def split_chat_text(tokenizer, prompt_prefix, prompt_suffix):
+    """
+    将套用模板后的对话文本在共享前缀处切开
+    :return: (prefix_text, suffix_text)，两者拼接等于完整的对话文本
+    """
+    content = prompt_prefix + prompt_suffix
+    text = build_chat_text(tokenizer, content)
+    cut = text.index(content) + len(prompt_prefix)
+    return text[:cut], text[cut:]
+
+
+class PrefixCache:
+    """
+    共享前缀的KV缓存
+    系统提示词和题干在多次提问之间保持不变，只需prefill一次，之后每次提问只prefill问题部分
+    """
+
+    def __init__(self, model, tokenizer):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.prefix_text = None
+        self.prefix_ids = None
+        self.past_key_values = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+
+    def clear(self):
+        """题干变化时调用，丢弃旧的KV缓存"""
+        with self._lock:
+            self.prefix_text = None
+            self.prefix_ids = None
+            self.past_key_values = None
+
+    def _ensure(self, prefix_text):
+        """前缀变化时重新prefill，调用方需持有锁"""
+        if prefix_text != self.prefix_text:
+            self.misses += 1
+            prefix_ids = self.tokenizer(prefix_text, return_tensors="pt").input_ids.to(self.model.device)
+            with torch.no_grad():
+                outputs = self.model(prefix_ids, past_key_values=DynamicCache(), use_cache=True)
+            self.prefix_text = prefix_text
+            self.prefix_ids = prefix_ids
+            self.past_key_values = outputs.past_key_values
+        else:
+            self.hits += 1
+
+    def warm(self, prefix_text):
+        """
+        提前计算前缀的KV缓存(如OCR识别题目期间)，之后的lookup直接命中
+        :return: 前缀token数
+        """
+        with self._lock:
+            self._ensure(prefix_text)
+            return self.prefix_ids.shape[-1]
+
+    def lookup(self, prefix_text):
+        """
+        获取前缀对应的token和KV缓存，前缀变化时自动重新计算
+        :param prefix_text: 套用模板后的前缀文本(见split_chat_text)
+        :return: (prefix_ids, past_key_values)，past_key_values为副本，可直接交给generate修改
+        """
+        with self._lock:
+            self._ensure(prefix_text)
+            # generate会在缓存后追加新token，必须复制一份
+            return self.prefix_ids, copy.deepcopy(self.past_key_values)
+
+
+class TimedStreamer(TextIteratorStreamer):
+    """在文本流的基础上记录首token时间和生成token数"""
+
+    def __init__(self, tokenizer, **kwargs):
+        super().__init__(tokenizer, skip_prompt=True, skip_special_tokens=True, **kwargs)
+        self.start_time = time.perf_counter()
+        self.first_token_time = None
+        self.end_time = None
+        self.token_count = 0
+
+    def put(self, value):
+        # generate第一次调用put传入的是提示词，跳过不计数
+        if self.skip_prompt and self.next_tokens_are_prompt:
+            super().put(value)
+            return
+
+        if self.first_token_time is None:
+            self.first_token_time = time.perf_counter()
+        self.token_count += value.numel()
+        super().put(value)
+
+    def end(self):
+        self.end_time = time.perf_counter()
+        super().end()
+
+    def stats(self):
+        """
+        汇总本次生成的耗时统计
+        :return: dict(ttft=首token耗时(s), new_tokens=生成token数, tokens_per_s=解码速度, total=总耗时(s))
+        """
+        end_time = self.end_time or time.perf_counter()
+        if self.first_token_time is None:
+            return {"ttft": None, "new_tokens": 0, "tokens_per_s": 0.0, "total": end_time - self.start_time}
+
+        decode_time = end_time - self.first_token_time
+        # 首token由prefill产生，解码速度只统计其后的token
+        decode_tokens = self.token_count - 1
+        tokens_per_s = decode_tokens / decode_time if decode_time > 0 and decode_tokens > 0 else 0.0
+        return {
+            "ttft": self.first_token_time - self.start_time,
+            "new_tokens": self.token_count,
+            "tokens_per_s": tokens_per_s,
+            "total": end_time - self.start_time,
+        }
+
+
+class EventStoppingCriteria(StoppingCriteria):
+    """stop_event被设置后在下一个token处停止生成，用于取消后台的推测生成"""
+
+    def __init__(self, stop_event):
+        self.stop_event = stop_event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.stop_event.is_set(), dtype=torch.bool,
+                          device=input_ids.device)
+
+
+def matching_prefix_length(cached_ids, input_ids):
+    """
+    KV缓存对应的token与本次输入相同的前缀长度，至少留一个token给本次prefill
+    :param cached_ids: 一维token序列
+    :param input_ids: 本次输入(1, L)
+    """
+    n = min(cached_ids.shape[-1], input_ids.shape[-1] - 1)
+    mismatch = (cached_ids[:n] != input_ids[0, :n]).nonzero()
+    return int(mismatch[0]) if mismatch.numel() > 0 else n
+
+
+def prepare_inputs(model, tokenizer, input_prompt, prompt_prefix=None, prefix_cache=None, history=None):
+    """
+    套用对话模板并对完整文本分词，可用时从prefix_cache取出共享前缀的KV缓存
+    前缀单独分词的结果在切分处可能与完整分词不同(如前缀末尾的空格会和下一个词合并)，只复用token一致的部分
+    :param history: 之前的对话消息(见build_chat_text)，带历史时不使用前缀缓存
+    :return: (input_ids, past_key_values)，没有可复用的前缀时past_key_values为None
+    """
+    text = build_chat_text(tokenizer, input_prompt, history)
+    input_ids = tokenizer([text], return_tensors="pt").input_ids.to(model.device)
+    if prefix_cache is None or history or not prompt_prefix or not input_prompt.startswith(prompt_prefix):
+        return input_ids, None
+
+    prefix_text, _ = split_chat_text(tokenizer, prompt_prefix, input_prompt[len(prompt_prefix):])
+    prefix_ids, past_key_values = prefix_cache.lookup(prefix_text)
+    reusable = matching_prefix_length(prefix_ids[0], input_ids)
+    if reusable == 0:
+        return input_ids, None
+    if reusable < past_key_values.get_seq_length():
+        past_key_values.crop(reusable)
+    return input_ids, past_key_values
+
+
+def find_draft_tokens(token_ids, ngram_size=3, num_draft_tokens=10):
+    """
+    提示词查找: 在已有序列中寻找与末尾n-gram相同的片段，取其后续token作为草稿
+    :param token_ids: 一维token序列(提示词+已生成部分)
+    :param ngram_size: 最长匹配长度，匹配不到时逐步缩短
+    :param num_draft_tokens: 草稿最大长度
+    :return: 草稿token(可能为空)
+    """
+    length = token_ids.shape[0]
+    for n in range(min(ngram_size, length - 1), 0, -1):
+        tail = token_ids[-n:]
+        windows = token_ids.unfold(0, n, 1)
+        starts = (windows == tail).all(dim=1).nonzero().flatten()
+        # 末尾n-gram自身也会被匹配到，需要排除；取最近一次出现的位置
+        starts = starts[starts + n < length]
+        if starts.numel() > 0:
+            end = int(starts[-1]) + n
+            return token_ids[end:end + num_draft_tokens]
+    return token_ids[:0]
+
+
+@torch.no_grad()
+def prompt_lookup_generate(model, input_ids, max_new_tokens=256, streamer=None, past_key_values=None,
+                           eos_token_id=None, ngram_size=3, num_draft_tokens=10, lookup_stats=None, stop_event=None,
+                           **kwargs):
+    """
+    提示词查找解码(prompt lookup decoding)，贪心解码
+    答案大段引用题干或题目原文时，从提示词中按n-gram查找草稿token，一次前向同时验证整段草稿
+    :param input_ids: 完整输入(1, L)，past_key_values中已缓存的部分不会重复计算
+    :param eos_token_id: 结束token，int或列表
+    :param lookup_stats: 传入dict时写入drafted、accepted、forward_passes、new_tokens
+    :param stop_event: 被设置后停止生成
+    :return: 输入与生成拼接后的token(1, L+N)
+    """
+    if past_key_values is None:
+        past_key_values = DynamicCache()
+    if eos_token_id is None:
+        eos_token_id = []
+    eos_ids = set(eos_token_id if isinstance(eos_token_id, (list, tuple)) else [eos_token_id])
+
+    if streamer is not None:
+        streamer.put(input_ids.cpu())
+
+    tokens = input_ids[0]
+    cached = past_key_values.get_seq_length()
+    outputs = model(input_ids[:, cached:], past_key_values=past_key_values, use_cache=True)
+    next_token = outputs.logits[0, -1:].argmax(-1)
+    forward_passes, drafted, accepted, generated = 1, 0, 0, 0
+
+    while True:
+        # next_token已确定但尚未写入KV缓存
+        new_tokens = next_token
+        draft = None
+        tokens = torch.cat([tokens, new_tokens])
+        generated += 1
+        finished = int(next_token) in eos_ids or generated >= max_new_tokens or \
+            (stop_event is not None and stop_event.is_set())
+        if not finished:
+            draft = find_draft_tokens(tokens, ngram_size, min(num_draft_tokens, max_new_tokens - generated))
+            cache_length = past_key_values.get_seq_length()
+            outputs = model(torch.cat([next_token, draft])[None], past_key_values=past_key_values, use_cache=True)
+            forward_passes += 1
+            predictions = outputs.logits[0].argmax(-1)
+
+            # 第i个位置的预测与第i个草稿token一致则接受，遇到第一个不一致处停止
+            mismatch = (predictions[:draft.shape[0]] != draft).nonzero()
+            n_accepted = int(mismatch[0]) if mismatch.numel() > 0 else draft.shape[0]
+            drafted += draft.shape[0]
+            accepted += n_accepted
+
+            accepted_tokens = draft[:n_accepted]
+            for i, token in enumerate(accepted_tokens.tolist()):
+                if token in eos_ids or generated + i + 1 >= max_new_tokens:
+                    accepted_tokens = accepted_tokens[:i + 1]
+                    finished = True
+                    break
+            tokens = torch.cat([tokens, accepted_tokens])
+            generated += accepted_tokens.shape[0]
+            new_tokens = torch.cat([new_tokens, accepted_tokens])
+
+            # 丢弃未被接受的草稿在KV缓存中的部分，第一个不一致位置的预测作为下一个token
+            past_key_values.crop(cache_length + 1 + n_accepted)
+            next_token = predictions[n_accepted:n_accepted + 1]
+
+        if streamer is not None:
+            streamer.put(new_tokens.cpu())
+        if finished:
+            break
+
+    if streamer is not None:
+        streamer.end()
+    if lookup_stats is not None:
+        lookup_stats.update(drafted=drafted, accepted=accepted, forward_passes=forward_passes, new_tokens=generated)
+    return tokens[None]
+
+
+def stream_response(model, tokenizer, input_prompt, max_new_tokens=256, stats=None, callback=None,
+                    prompt_prefix=None, prefix_cache=None, prompt_lookup=False, stop_event=None, history=None):
+    """
+    流式生成回答，边解码边返回文本片段
+    :param model: 已加载的模型
+    :param tokenizer: 对应的分词器
+    :param input_prompt: 用户输入
+    :param max_new_tokens: 最大生成token数
+    :param stats: 传入dict时，生成结束后写入耗时统计(见TimedStreamer.stats)
+    :param callback: 每得到一段文本时调用 callback(text)
+    :param prompt_prefix: input_prompt中多次提问共享的前缀(如题干)
+    :param prefix_cache: PrefixCache对象，与prompt_prefix一起使用时复用前缀的KV缓存
+    :param prompt_lookup: 为True时使用提示词查找解码(贪心)，stats中额外记录草稿接受率
+    :param stop_event: threading.Event，被设置后在下一个token处停止生成
+    :param history: 之前的对话消息(见build_chat_text)，用于没有ChatSession的多轮对话
+    :return: 文本片段生成器
+    """
+    streamer = TimedStreamer(tokenizer)
+    generate_kwargs = dict(max_new_tokens=max_new_tokens, streamer=streamer)
+    if stop_event is not None:
+        if prompt_lookup:
+            generate_kwargs.update(stop_event=stop_event)
+        else:
+            generate_kwargs.update(stopping_criteria=StoppingCriteriaList([EventStoppingCriteria(stop_event)]))
+
+    input_ids, past_key_values = prepare_inputs(model, tokenizer, input_prompt, prompt_prefix, prefix_cache,
+                                                history)
+    cached_tokens = past_key_values.get_seq_length() if past_key_values is not None else 0
+    if past_key_values is not None:
+        generate_kwargs.update(past_key_values=past_key_values)
+    generate_kwargs.update(input_ids=input_ids, attention_mask=torch.ones_like(input_ids))
+
+    errors = []
+    lookup_stats = {}
+
+    def _generate():
+        try:
+            if prompt_lookup:
+                prompt_lookup_generate(model, eos_token_id=model.generation_config.eos_token_id,
+                                       lookup_stats=lookup_stats, **generate_kwargs)
+            else:
+                model.generate(**generate_kwargs)
+        except Exception as e:
+            errors.append(e)
+            streamer.end()  # 避免主线程一直等待
+
+    # generate在后台线程运行，主线程从streamer中逐段取出文本
+    thread = Thread(target=_generate, daemon=True)
+    thread.start()
+
+    for new_text in streamer:
+        if not new_text:
+            continue
+        if callback is not None:
+            callback(new_text)
+        yield new_text
+
+    thread.join()
+    if errors:
+        raise errors[0]
+    if stats is not None:
+        stats.update(streamer.stats())
+        stats.update(prompt_tokens=input_ids.shape[-1], cached_tokens=cached_tokens)
+        if lookup_stats:
+            drafted = lookup_stats["drafted"]
+            stats.update(
+                draft_acceptance=lookup_stats["accepted"] / drafted if drafted else 0.0,
+                # 普通解码每次前向只生成一个token，这个比值即为前向次数上的加速比
+                tokens_per_forward=lookup_stats["new_tokens"] / lookup_stats["forward_passes"],
+            )
+
+
+def get_response(model, tokenizer, input_prompt, max_new_tokens=256, stats=None):
+    """阻塞式生成完整回答"""
+    return "".join(stream_response(model, tokenizer, input_prompt, max_new_tokens, stats=stats))
+
+
+# 选项标记: "A." "B、" "C：" "(D)" 等
+OPTION_PATTERN = re.compile(r"[（(]\s*([A-H])\s*[)）]|(?<![A-Za-z])([A-H])\s*[.．、:：]")
+CHOICE_INSTRUCTION = "\n这是一道选择题，请直接回答正确选项的字母。"
+
+
+def detect_options(question_text):
+    """
+    检测选择题的选项字母
+    :return: 从A开始连续出现的选项字母列表，不足两个选项时返回空列表
+    """
+    found = {a or b for a, b in OPTION_PATTERN.findall(question_text)}
+    options = []
+    for letter in "ABCDEFGH":
+        if letter not in found:
+            break
+        options.append(letter)
+    return options if len(options) >= 2 else []
+
+
+@torch.no_grad()
+def score_options(model, tokenizer, input_prompt, options, prompt_prefix=None, prefix_cache=None, stats=None):
+    """
+    选择题打分: 只做一次prefill，比较下一个token为各选项字母的概率，不需要逐token解码
+    :param options: 选项字母列表(见detect_options)
+    :param stats: 传入dict时写入total、prompt_tokens、cached_tokens
+    :return: (选中的字母, {字母: 概率})，概率在各选项之间归一化
+    """
+    start_time = time.perf_counter()
+    input_ids, past_key_values = prepare_inputs(model, tokenizer, input_prompt + CHOICE_INSTRUCTION,
+                                                prompt_prefix, prefix_cache)
+    cached_tokens = past_key_values.get_seq_length() if past_key_values is not None else 0
+    if past_key_values is None:
+        past_key_values = DynamicCache()
+
+    logits = model(input_ids[:, cached_tokens:], past_key_values=past_key_values, use_cache=True).logits[0, -1]
+    option_ids = [tokenizer.encode(letter, add_special_tokens=False)[0] for letter in options]
+    probs = torch.softmax(logits[option_ids].float(), dim=-1).tolist()
+
+    probabilities = dict(zip(options, probs))
+    choice = max(probabilities, key=probabilities.get)
+    if stats is not None:
+        stats.update(total=time.perf_counter() - start_time, prompt_tokens=input_ids.shape[-1],
+                     cached_tokens=cached_tokens)
+    return choice, probabilities
+
+
+def batch_responses(model, tokenizer, input_prompts, max_new_tokens=256, stats=None):
+    """
+    一次generate同时解答多个问题
+    :param input_prompts: 用户输入列表
+    :param stats: 传入dict时写入batch_size、new_tokens、tokens_per_s、total
+    :return: 与input_prompts顺序一致的回答列表
+    """
+    if not input_prompts:
+        return []
+
+    texts = [build_chat_text(tokenizer, prompt) for prompt in input_prompts]
+
+    # 解码器模型需要左侧填充，保证每条序列的最后一个token紧挨着生成位置
+    padding_side = tokenizer.padding_side
+    tokenizer.padding_side = "left"
+    try:
+        model_inputs = tokenizer(texts, return_tensors="pt", padding=True).to(model.device)
+    finally:
+        tokenizer.padding_side = padding_side
+
+    start_time = time.perf_counter()
+    generated_ids = model.generate(
+        model_inputs.input_ids,
+        attention_mask=model_inputs.attention_mask,
+        max_new_tokens=max_new_tokens,
+        pad_token_id=tokenizer.pad_token_id,
+    )
+    total = time.perf_counter() - start_time
+
+    generated_ids = generated_ids[:, model_inputs.input_ids.shape[-1]:]
+    responses = tokenizer.batch_decode(generated_ids, skip_special_tokens=True)
+
+    if stats is not None:
+        # 先结束的序列会被pad填充，不计入生成数
+        new_tokens = int((generated_ids != tokenizer.pad_token_id).sum())
+        stats.update(
+            batch_size=len(input_prompts),
+            new_tokens=new_tokens,
+            tokens_per_s=new_tokens / total if total > 0 else 0.0,
+            total=total,
+        )
+    return responses
+
+
+class ChatSession:
+    """
+    多轮对话会话：保存消息历史和KV缓存，每轮只prefill新增的用户消息
+    历史超出上下文预算时丢弃最早的对话轮次
+    """
+
+    def __init__(self, model, tokenizer, system_prompt=SYSTEM_PROMPT, max_context_tokens=4096,
+                 max_new_tokens=1024):
+        """
+        :param max_context_tokens: 上下文预算(提示词+本轮最大生成长度)
+        :param max_new_tokens: 每轮最大生成token数
+        """
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_context_tokens = max_context_tokens
+        self.max_new_tokens = max_new_tokens
+        self.messages = [{"role": "system", "content": system_prompt}]
+        self.past_key_values = None
+        self.cached_ids = None  # 与past_key_values一一对应的token
+        self.evicted_turns = 0
+
+    def reset(self):
+        del self.messages[1:]
+        self.past_key_values = None
+        self.cached_ids = None
+
+    def _build_input_ids(self):
+        """套用模板并分词，超出预算时丢弃最早的一轮(用户+助手)对话"""
+        while True:
+            text = self.tokenizer.apply_chat_template(self.messages, tokenize=False, add_generation_prompt=True)
+            input_ids = self.tokenizer([text], return_tensors="pt").input_ids.to(self.model.device)
+            if input_ids.shape[-1] + self.max_new_tokens <= self.max_context_tokens or len(self.messages) <= 2:
+                return input_ids
+            del self.messages[1:3]
+            self.evicted_turns += 1
+
+    def _reuse_cache(self, input_ids):
+        """
+        保留KV缓存中与本轮输入相同的前缀部分
+        :return: 可复用的token数
+        """
+        if self.past_key_values is None:
+            self.past_key_values = DynamicCache()
+            return 0
+
+        reusable = matching_prefix_length(self.cached_ids, input_ids)
+        if reusable == 0:
+            self.past_key_values = DynamicCache()
+        else:
+            self.past_key_values.crop(reusable)
+        return reusable
+
+    def stream(self, user_text, stats=None):
+        """
+        发送一轮用户消息并流式返回回答
+        :param stats: 传入dict时写入耗时统计，另含prompt_tokens、cached_tokens、history_turns、evicted_turns
+        :return: 文本片段生成器
+        """
+        self.messages.append({"role": "user", "content": user_text})
+        input_ids = self._build_input_ids()
+        cached_tokens = self._reuse_cache(input_ids)
+
+        streamer = TimedStreamer(self.tokenizer)
+        generate_kwargs = dict(
+            input_ids=input_ids,
+            attention_mask=torch.ones_like(input_ids),
+            past_key_values=self.past_key_values,
+            max_new_tokens=self.max_new_tokens,
+            streamer=streamer,
+        )
+        result = {}
+
+        def _generate():
+            try:
+                result["sequences"] = self.model.generate(**generate_kwargs)
+            except Exception as e:
+                result["error"] = e
+                streamer.end()
+
+        thread = Thread(target=_generate, daemon=True)
+        thread.start()
+
+        pieces = []
+        for new_text in streamer:
+            if new_text:
+                pieces.append(new_text)
+                yield new_text
+        thread.join()
+
+        if "error" in result:
+            # 本轮失败，撤回用户消息并丢弃可能不完整的缓存
+            self.messages.pop()
+            self.past_key_values = None
+            self.cached_ids = None
+            raise result["error"]
+
+        # generate结束后缓存中包含输入和除最后一个token外的生成内容
+        sequences = result["sequences"][0]
+        self.cached_ids = sequences[:self.past_key_values.get_seq_length()]
+        self.messages.append({"role": "assistant", "content": "".join(pieces)})
+
+        if stats is not None:
+            stats.update(streamer.stats())
+            stats.update(prompt_tokens=input_ids.shape[-1], cached_tokens=cached_tokens,
+                         history_turns=(len(self.messages) - 1) // 2, evicted_turns=self.evicted_turns)
+
+
+class LocalLLM:
+    """
+    进程内加载的模型，封装加载、前缀缓存和各种生成方式
+    接口与llm_client.LLMClient一致，前端可以在两者之间切换
+    """
+
+    def __init__(self, model_path=MODEL_PATH, backend=DEFAULT_BACKEND, on_ready=None, **model_kwargs):
+        """
+        :param on_ready: 模型加载完成后调用 on_ready(model, tokenizer)
+        """
+        self._on_ready_callback = on_ready
+        self.prefix_cache = None
+        self.loader = ModelLoader(model_path, on_ready=self._on_ready, backend=backend, **model_kwargs)
+        self.backend = self.loader.backend
+
+    def _on_ready(self, model, tokenizer):
+        self.prefix_cache = PrefixCache(model, tokenizer)
+        if self._on_ready_callback is not None:
+            self._on_ready_callback(model, tokenizer)
+
+    def start(self):
+        """开始后台加载"""
+        self.loader.start()
+        return self
+
+    def is_ready(self):
+        return self.loader.is_ready()
+
+    def wait(self, timeout=None):
+        """等待模型加载完成，返回(model, tokenizer)"""
+        return self.loader.wait(timeout)
+
+    def clear_prefix(self):
+        """题干变化时丢弃共享前缀的KV缓存"""
+        if self.prefix_cache is not None:
+            self.prefix_cache.clear()
+
+    def prefill(self, prompt_prefix):
+        """
+        预先计算系统提示词和共享前缀的KV缓存，之后以该前缀提问时只需prefill问题部分
+        :return: 前缀token数
+        """
+        _, tokenizer = self.wait()
+        prefix_text, _ = split_chat_text(tokenizer, prompt_prefix, "")
+        return self.prefix_cache.warm(prefix_text)
+
+    def stream_response(self, input_prompt, max_new_tokens=256, stats=None, prompt_prefix=None,
+                        prompt_lookup=False, stop_event=None, history=None):
+        model, tokenizer = self.wait()
+        return stream_response(model, tokenizer, input_prompt, max_new_tokens, stats=stats,
+                               prompt_prefix=prompt_prefix, prefix_cache=self.prefix_cache,
+                               prompt_lookup=prompt_lookup, stop_event=stop_event, history=history)
+
+    def get_response(self, input_prompt, max_new_tokens=256, stats=None, prompt_prefix=None,
+                     prompt_lookup=False):
+        return "".join(self.stream_response(input_prompt, max_new_tokens, stats, prompt_prefix, prompt_lookup))
+
+    def batch_responses(self, input_prompts, max_new_tokens=256, stats=None):
+        model, tokenizer = self.wait()
+        return batch_responses(model, tokenizer, input_prompts, max_new_tokens, stats=stats)
+
+    def score_options(self, input_prompt, options, prompt_prefix=None, stats=None):
+        model, tokenizer = self.wait()
+        return score_options(model, tokenizer, input_prompt, options, prompt_prefix=prompt_prefix,
+                             prefix_cache=self.prefix_cache, stats=stats)
+
+
+def format_stats(stats):
+    """将耗时统计格式化为一行文本"""
+    if not stats:
+        return ""
+    if "batch_size" in stats:
+        return (f"批量大小: {stats['batch_size']} | 生成token数: {stats['new_tokens']} | "
+                f"总吞吐: {stats['tokens_per_s']:.1f} tokens/s | 总耗时: {stats['total']:.2f}s")
+    ttft = f"{stats['ttft']:.2f}s" if stats.get("ttft") is not None else "-"
+    line = (f"首token耗时: {ttft} | 生成token数: {stats['new_tokens']} | "
+            f"解码速度: {stats['tokens_per_s']:.1f} tokens/s | 总耗时: {stats['total']:.2f}s")
+    if stats.get("cached_tokens"):
+        line += f" | 复用前缀: {stats['cached_tokens']}/{stats['prompt_tokens']} tokens"
+    if "history_turns" in stats:
+        line += f" | 历史轮数: {stats['history_turns']}(已丢弃{stats['evicted_turns']})"
+    if "draft_acceptance" in stats:
+        line += (f" | 草稿接受率: {stats['draft_acceptance']:.0%}"
+                 f" | 每次前向生成: {stats['tokens_per_forward']:.2f} tokens")
+    return line
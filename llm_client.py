@@ -0,0 +1,129 @@
+"""
+本地推理服务(llm_server.py)的客户端
+接口与llm.LocalLLM一致，前端不需要关心模型在本进程还是在推理服务中
+"""
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+
+DEFAULT_URL = os.environ.get("QWEN_SERVER_URL", "http://127.0.0.1:8765")
+
+
+class LLMClient:
+    def __init__(self, url=DEFAULT_URL, timeout=600):
+        """
+        :param url: 推理服务地址
+        :param timeout: 单次请求超时(s)
+        """
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.backend = None
+
+    def _health(self, timeout=1.0):
+        try:
+            with urllib.request.urlopen(self.url + "/health", timeout=timeout) as resp:
+                health = json.loads(resp.read())
+        except (urllib.error.URLError, OSError, ValueError):
+            return None
+        self.backend = health.get("backend")
+        return health
+
+    def _post(self, path, payload):
+        request = urllib.request.Request(
+            self.url + path,
+            data=json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        return urllib.request.urlopen(request, timeout=self.timeout)
+
+    def is_available(self):
+        """推理服务是否在运行(模型可能仍在加载)"""
+        return self._health() is not None
+
+    def is_ready(self):
+        health = self._health()
+        return bool(health and health.get("ready"))
+
+    def wait(self, timeout=None, interval=0.5):
+        """等待服务端模型加载完成"""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while not self.is_ready():
+            if deadline is not None and time.perf_counter() >= deadline:
+                raise TimeoutError("推理服务模型加载超时")
+            time.sleep(interval)
+
+    def clear_prefix(self):
+        """服务端前缀缓存按前缀文本自动失效，这里无需操作"""
+
+    def prefill(self, prompt_prefix):
+        """让服务端预先计算共享前缀的KV缓存，返回前缀token数"""
+        return self._call("/prefill", {"prompt_prefix": prompt_prefix})["prefix_tokens"]
+
+    def stream_response(self, input_prompt, max_new_tokens=256, stats=None, prompt_prefix=None,
+                        prompt_lookup=False, stop_event=None, history=None):
+        """
+        stop_event被设置后断开连接，服务端随之停止生成
+        history为之前的对话消息，服务端不保存会话，多轮对话由调用方维护历史
+        """
+        payload = {"prompt": input_prompt, "prompt_prefix": prompt_prefix,
+                   "max_new_tokens": max_new_tokens, "stream": True, "prompt_lookup": prompt_lookup}
+        if history:
+            payload["history"] = history
+        with self._post("/generate", payload) as resp:
+            for line in resp:
+                if stop_event is not None and stop_event.is_set():
+                    return
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                if "error" in item:
+                    raise RuntimeError(f"推理服务出错: {item['error']}")
+                if "text" in item:
+                    yield item["text"]
+                elif "stats" in item and stats is not None:
+                    stats.update(item["stats"])
+
+    def get_response(self, input_prompt, max_new_tokens=256, stats=None, prompt_prefix=None,
+                     prompt_lookup=False):
+        return "".join(self.stream_response(input_prompt, max_new_tokens, stats, prompt_prefix, prompt_lookup))
+
+    def _call(self, path, payload, stats=None):
+        try:
+            with self._post(path, payload) as resp:
+                result = json.loads(resp.read())
+        except urllib.error.HTTPError as e:
+            result = json.loads(e.read() or b"{}")
+        if "error" in result:
+            raise RuntimeError(f"推理服务出错: {result['error']}")
+        if stats is not None:
+            stats.update(result.get("stats", {}))
+        return result
+
+    def batch_responses(self, input_prompts, max_new_tokens=256, stats=None):
+        payload = {"prompts": input_prompts, "max_new_tokens": max_new_tokens}
+        return self._call("/batch", payload, stats)["responses"]
+
+    def score_options(self, input_prompt, options, prompt_prefix=None, stats=None):
+        payload = {"prompt": input_prompt, "options": options, "prompt_prefix": prompt_prefix}
+        result = self._call("/score", payload, stats)
+        return result["choice"], result["probabilities"]
+
+
+def connect_or_load(backend=None, on_ready=None, **model_kwargs):
+    """
+    推理服务在运行时返回LLMClient，否则在本进程中后台加载模型
+    :param backend: 本地加载时使用的推理后端
+    :param on_ready: 本地加载完成后的回调
+    :return: LLMClient 或 已开始加载的llm.LocalLLM
+    """
+    client = LLMClient()
+    if client.is_available():
+        print(f"已连接推理服务: {client.url} (后端: {client.backend})")
+        return client
+
+    import llm
+    print("未检测到推理服务，在本进程中加载模型......")
+    return llm.LocalLLM(llm.MODEL_PATH, backend=backend or llm.DEFAULT_BACKEND,
+                        on_ready=on_ready, **model_kwargs).start()
@@ -0,0 +1,216 @@
+"""
+本地推理服务：模型只加载一次，main.py、Qwen1.5_Chat.py等前端通过llm_client共享
+重启截屏界面时不需要重新加载权重
+
+用法: python llm_server.py [--host 127.0.0.1] [--port 8765] [--backend auto]
+
+接口:
+    GET  /health    {"ready": bool, "backend": str, "queued": int}
+    POST /generate  {"prompt", "prompt_prefix", "max_new_tokens", "stream", "prompt_lookup", "history"}
+                    history为之前的对话消息[{"role", "content"}, ...]，由客户端保存，用于多轮对话
+                    stream为true时逐行返回 {"text": ...}，最后一行为 {"stats": {...}}
+    POST /batch     {"prompts", "max_new_tokens"} -> {"responses": [...], "stats": {...}}
+    POST /score     {"prompt", "options", "prompt_prefix"} -> {"choice": str, "probabilities": {...}, "stats": {...}}
+    POST /prefill   {"prompt_prefix"} -> {"prefix_tokens": int, "stats": {...}}  预先计算共享前缀的KV缓存
+"""
+import argparse
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import llm
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+_END = object()  # 任务输出结束标记
+
+
+class Job:
+    """一次推理请求，由推理线程执行，结果通过output队列交给HTTP线程"""
+
+    def __init__(self, kind, payload):
+        self.kind = kind
+        self.payload = payload
+        self.output = queue.Queue()
+        self.cancelled = threading.Event()
+        self.enqueue_time = time.perf_counter()
+        self.queue_wait = 0.0
+
+
+class InferenceWorker:
+    """单线程串行执行推理请求，并发请求在队列中排队"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.jobs = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, kind, payload):
+        job = Job(kind, payload)
+        self.jobs.put(job)
+        return job
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job.cancelled.is_set():
+                continue
+            job.queue_wait = time.perf_counter() - job.enqueue_time
+            try:
+                if job.kind == "generate":
+                    self._generate(job)
+                elif job.kind == "score":
+                    self._score(job)
+                elif job.kind == "prefill":
+                    self._prefill(job)
+                else:
+                    self._batch(job)
+            except Exception as e:
+                job.output.put({"error": str(e)})
+            finally:
+                job.output.put(_END)
+
+    def _generate(self, job):
+        payload = job.payload
+        stats = {}
+        stream = self.engine.stream_response(
+            payload["prompt"],
+            max_new_tokens=payload.get("max_new_tokens", 256),
+            stats=stats,
+            prompt_prefix=payload.get("prompt_prefix"),
+            prompt_lookup=payload.get("prompt_lookup", False),
+            stop_event=job.cancelled,  # 客户端断开后停止生成
+            history=payload.get("history"),
+        )
+        for text in stream:
+            if job.cancelled.is_set():
+                # 客户端已断开，不再转发
+                stream.close()
+                return
+            job.output.put({"text": text})
+        stats["queue_wait"] = job.queue_wait
+        job.output.put({"stats": stats})
+
+    def _batch(self, job):
+        payload = job.payload
+        stats = {}
+        responses = self.engine.batch_responses(
+            payload["prompts"],
+            max_new_tokens=payload.get("max_new_tokens", 256),
+            stats=stats,
+        )
+        stats["queue_wait"] = job.queue_wait
+        job.output.put({"responses": responses, "stats": stats})
+
+    def _score(self, job):
+        payload = job.payload
+        stats = {}
+        choice, probabilities = self.engine.score_options(
+            payload["prompt"],
+            payload["options"],
+            prompt_prefix=payload.get("prompt_prefix"),
+            stats=stats,
+        )
+        stats["queue_wait"] = job.queue_wait
+        job.output.put({"choice": choice, "probabilities": probabilities, "stats": stats})
+
+
+    def _prefill(self, job):
+        start = time.perf_counter()
+        prefix_tokens = self.engine.prefill(job.payload["prompt_prefix"])
+        stats = {"total": time.perf_counter() - start, "queue_wait": job.queue_wait}
+        job.output.put({"prefix_tokens": prefix_tokens, "stats": stats})
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    worker = None  # 由serve()设置
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, obj, status=200):
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/health":
+            self._send_json({"error": "not found"}, 404)
+            return
+        engine = self.worker.engine
+        self._send_json({"ready": engine.is_ready(), "backend": engine.backend,
+                         "queued": self.worker.jobs.qsize()})
+
+    def do_POST(self):
+        if self.path not in ("/generate", "/batch", "/score", "/prefill"):
+            self._send_json({"error": "not found"}, 404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+
+        job = self.worker.submit(self.path[1:], payload)
+        if self.path == "/generate" and payload.get("stream"):
+            self._stream(job)
+            return
+
+        result = {}
+        while True:
+            item = job.output.get()
+            if item is _END:
+                break
+            if "text" in item:
+                result["text"] = result.get("text", "") + item["text"]
+            else:
+                result.update(item)
+        self._send_json(result, 500 if "error" in result else 200)
+
+    def _stream(self, job):
+        """逐行输出JSON，连接关闭即表示结束"""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+        self.end_headers()
+        try:
+            while True:
+                item = job.output.get()
+                if item is _END:
+                    break
+                self.wfile.write((json.dumps(item, ensure_ascii=False) + "\n").encode("utf-8"))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            job.cancelled.set()
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, backend=llm.DEFAULT_BACKEND):
+    start_time = time.perf_counter()
+    engine = llm.LocalLLM(
+        llm.MODEL_PATH,
+        backend=backend,
+        on_ready=lambda m, t: print(f"模型加载完成！(耗时 {time.perf_counter() - start_time:.2f}s)"),
+    ).start()
+
+    RequestHandler.worker = InferenceWorker(engine)
+    server = ThreadingHTTPServer((host, port), RequestHandler)
+    server.daemon_threads = True
+    print(f"推理服务已启动: http://{host}:{port} (后端: {engine.backend})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("⏹️ 用户中断")
+    finally:
+        server.server_close()
+        print("推理服务已停止")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Qwen1.5本地推理服务")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--backend", default=llm.DEFAULT_BACKEND, choices=llm.BACKENDS)
+    args = parser.parse_args()
+    serve(args.host, args.port, args.backend)
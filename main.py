@@ -1,92 +1,190 @@
 import subprocess
-import dxcam
+import os
 import cv2
-import pygetwindow as gw
 import time
-import pyautogui
 import keyboard
 import OCR_identify
-from PIL import Image
-from transformers import AutoModelForCausalLM, AutoTokenizer
+import capture
+import llm
+from llm_client import connect_or_load
+from answer_cache import AnswerCache
+from speculative import SpeculativeAnswerer
+import roi_templates
+from roi_templates import ROITemplateStore
 from src import *
 
-model_id = get_device()
-print(f"设备型号: {model_id}")  # 输出: 2304FPN6DC
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 
-print("\n 正在加载模型......")
-device = "cuda"  # the device to load the model onto
-
-model = AutoModelForCausalLM.from_pretrained(
-    "./Qwen1.5-1.8B-Chat",
-    torch_dtype="auto",
-    device_map="auto",
-    # attn_implementation="eager"
-)
-
-tokenizer = AutoTokenizer.from_pretrained("./Qwen1.5-1.8B-Chat")
-print("模型加载完成！")
+startup_timer = StartupTimer()
 
+# 分带识别的子进程必须在任何后台线程(模型加载、OCR预热)启动之前fork，
+# 否则子进程会继承其他线程持有的锁而在预热时永久阻塞
+with startup_timer.phase("启动OCR进程池"):
+    OCR_identify.start_band_pool()
 
-# 启动投屏
-process = subprocess.Popen(["scrcpy", "-m", "1024", "--max-fps", "45", "--no-audio", "--no-control"])
-time.sleep(1)
+model_load_start = time.perf_counter()
 
-# 创建摄像头对象
-camera = dxcam.create()
 
-# 获取用户输入的目标窗口标题
-window_name = None
-print("\n======获取窗口标题======")
-if model_id:
-    print(f"请确认{model_id}是否是新窗口名(是请输入yes)")
-    if str(input("请输入：")).strip().lower() == 'yes':
-        window_name = model_id
+def on_model_ready(loaded_model, loaded_tokenizer):
+    startup_timer.record("模型加载", model_load_start, time.perf_counter())
+    print(f"\n模型加载完成！(耗时 {time.perf_counter() - model_load_start:.2f}s)")
 
-for _ in range(3):
-    print("========请保持截屏窗口前台运行！！！=========")
 
-if window_name is None:
-    window_name = input("请输入目标窗口标题(支持部分匹配): ").strip()
-
-# 初始获取窗口区域
-region = get_window_rect_by_title(window_name)
-if region is None:
-    print(f"找不到标题包含 '{window_name}' 的窗口或窗口不在屏幕内, 自动结束程序")
+# 优先连接已运行的推理服务(llm_server.py)，否则在后台线程加载模型，同时启动投屏和捕获
+print("\n 正在准备模型......")
+engine = connect_or_load(
+    backend=llm.DEFAULT_BACKEND,  # 无GPU时自动使用CPU int8量化
+    on_ready=on_model_ready,
+    # attn_implementation="eager"
+)
+print(f"推理后端: {engine.backend}")
+
+# OCR前裁剪到文字区域，去掉状态栏、留白、图片等，减少tesseract处理的像素
+OCR_AUTO_CROP = True
+
+# 选择题打分：检测到A/B/C/D选项时只做一次前向比较选项概率，代替逐token生成
+CHOICE_SCORING = True
+
+# 生成参数，参与答案缓存的键，修改后旧答案不会再命中
+MAX_NEW_TOKENS = 256
+# 提示词查找解码：答案大段引用题干/题目原文时可以明显加速(使用贪心解码)
+PROMPT_LOOKUP = False
+GENERATION_SETTINGS = llm.generation_settings(engine.backend, MAX_NEW_TOKENS, PROMPT_LOOKUP)
+answer_cache = AnswerCache()
+
+# 捕获后端(capture.BACKENDS)，默认Windows使用dxcam、Linux使用mss
+# 设置CAPTURE_BACKEND=replay、CAPTURE_REPLAY=录屏文件或图片文件夹时回放录制的画面
+CAPTURE_BACKEND = os.environ.get("CAPTURE_BACKEND", "auto")
+CAPTURE_OPTIONS = {"source": os.environ.get("CAPTURE_REPLAY")} if CAPTURE_BACKEND == "replay" else {}
+REPLAY = CAPTURE_BACKEND == "replay"
+if REPLAY and not CAPTURE_OPTIONS["source"]:
+    print("回放模式需要设置CAPTURE_REPLAY=录屏文件或图片文件夹")
     exit(0)
-
-
-def get_response(input_prompt):
-    messages = [{"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user", "content": input_prompt}]
-
-    text = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-
-    model_inputs = tokenizer([text], return_tensors="pt").to(device)
-
-    generated_ids = model.generate(model_inputs.input_ids, max_new_tokens=256)
-
-    generated_ids = [output_ids[len(input_ids):] for input_ids, output_ids in
-                     zip(model_inputs.input_ids, generated_ids)]
-
-    model_response = tokenizer.batch_decode(generated_ids, skip_special_tokens=True)[0]
-
-    return model_response
+# 回放时不需要投屏窗口；无法按标题定位窗口的平台(如Linux)捕获整个屏幕
+TRACK_WINDOW = not REPLAY and WINDOW_TRACKING
+
+# 流水线解答(默认)：OCR期间模型预先prefill系统提示词和题干，多道题时边解答当前题边识别下一题，第一题的答案最早输出
+# 关闭后等全部题目识别完再合并为一次批量生成(总吞吐更高，但要等所有答案一起输出)，一次框选很多道题时可以关闭
+PIPELINE_ANSWERS = True
+ocr_executor = ThreadPoolExecutor(max_workers=1)      # 按框选顺序依次识别
+prefill_executor = ThreadPoolExecutor(max_workers=1)
+
+# 后台推测解答：画面变化并稳定后自动识别题目区域、提前开始生成，按'o'时直接使用
+SPECULATIVE_ANSWERS = False
+# 题目区域的归一化坐标(x0, y0, x1, y1)；None时使用上一次按'o'框选的单个区域
+SPECULATIVE_ROI = None
+
+# 区域模板：按窗口保存框选区域，框选窗口中按数字键直接使用，按's'把本次框选保存为模板
+# 投屏窗口标题是设备型号，同一设备上不同App的题目位置不同时，把ROI_TEMPLATE_SCOPE设为App名区分
+ROI_TEMPLATE_SCOPE = None
+template_store = ROITemplateStore()
+
+with ThreadPoolExecutor(max_workers=4) as startup_pool:
+    # adb探测、创建摄像头对象和加载OCR语言模型互不依赖，与启动投屏并行
+    camera_future = startup_pool.submit(capture.create_capture, CAPTURE_BACKEND, **CAPTURE_OPTIONS)
+    ocr_future = startup_pool.submit(lambda: OCR_identify.get_engine().warmup())
+    band_pool_future = startup_pool.submit(OCR_identify.warmup_band_pool)
+
+    process = None
+    model_id = None
+    if not REPLAY:
+        device_future = startup_pool.submit(get_device)
+
+        # 启动投屏
+        with startup_timer.phase("启动投屏"):
+            process = subprocess.Popen(["scrcpy", "-m", "1024", "--max-fps", "45", "--no-audio", "--no-control"])
+
+        with startup_timer.phase("adb设备探测"):
+            model_id = device_future.result()
+        print(f"设备型号: {model_id}")  # 输出: 2304FPN6DC
+
+    # 投屏窗口标题默认为设备型号，轮询等待窗口出现，代替固定等待
+    if model_id and TRACK_WINDOW:
+        with startup_timer.phase("等待投屏窗口"):
+            wait_for_window(model_id, timeout=10)
+
+    # 创建摄像头对象
+    with startup_timer.phase("创建摄像头"):
+        camera = camera_future.result()
+
+    with startup_timer.phase("加载OCR引擎"):
+        ocr_future.result()
+        band_pool_future.result()
+
+window_tracker = None
+if REPLAY:
+    # 捕获录制画面的整帧，区域模板按录制文件名保存
+    window_name = os.path.basename(os.path.normpath(CAPTURE_OPTIONS["source"]))
+    region = None
+    print(f"回放模式: {CAPTURE_OPTIONS['source']}")
+elif not TRACK_WINDOW:
+    window_name = model_id or "screen"
+    region = None
+    print("当前平台无法按标题定位窗口(pygetwindow仅支持Windows/macOS)，捕获整个屏幕")
+else:
+    # 获取用户输入的目标窗口标题
+    window_name = None
+    print("\n======获取窗口标题======")
+    if model_id:
+        print(f"请确认{model_id}是否是新窗口名(是请输入yes)")
+        if str(input("请输入：")).strip().lower() == 'yes':
+            window_name = model_id
+
+    for _ in range(3):
+        print("========请保持截屏窗口前台运行！！！=========")
+
+    if window_name is None:
+        window_name = input("请输入目标窗口标题(支持部分匹配): ").strip()
+
+    # 初始获取窗口区域
+    with startup_timer.phase("获取窗口区域"):
+        region = wait_for_window(window_name, timeout=5)
+    if region is None:
+        print(f"找不到标题包含 '{window_name}' 的窗口或窗口不在屏幕内, 自动结束程序")
+        exit(0)
+    # 之后只读取该窗口句柄的位置，区域变化防抖后才重启捕获
+    window_tracker = WindowTracker(window_name)
+    region = window_tracker.locate() or region
+    window_tracker.region = region
+template_scope = ROI_TEMPLATE_SCOPE or window_name
+
+
+def stream_response(input_prompt, stats=None, prompt_prefix=None):
+    """流式返回答案片段，生成结束后stats中记录首token耗时和解码速度"""
+    return engine.stream_response(input_prompt, max_new_tokens=MAX_NEW_TOKENS, stats=stats,
+                                  prompt_prefix=prompt_prefix, prompt_lookup=PROMPT_LOOKUP)
+
+
+def set_description(text):
+    """更新题干，同时让旧题干的KV缓存失效"""
+    global description
+    description = text
+    engine.clear_prefix()
 
 
 def press_i(img):
-    global description
     choice = str(input("是否将此文件设置为题干(是请输入yes)："))
     if choice.strip().lower() == "yes":
         print("请选题目区域：")
-        selector = ROISelector(img)
-        img = selector.select_roi()
-        desc = OCR_identify.ocr_identify(img, d_conf=30)
+        selector, img = select_regions(img, roi_templates.DESCRIPTION, multi=False)
+        if img is None:
+            print("未选择任何区域")
+            return
+        # 题干通常是较长的阅读材料，分带并行识别
+        ocr_stats = {}
+        desc = OCR_identify.ocr_identify(img, d_conf=30, band_split="auto", auto_crop=OCR_AUTO_CROP,
+                                         stats=ocr_stats)
+        if OCR_AUTO_CROP:
+            print(OCR_identify.format_crop_stats(ocr_stats))
         print("以下是否是题干：\n")
         for paragraph in desc:
             print(paragraph)
         choice = str(input("是否将该文段设置为题干(是请输入yes)："))
         if choice.strip().lower() == "yes":
-            description = "\n".join(desc)
+            set_description("\n".join(desc))
             return
 
     print("请输入题干（输入<exit>结束）：")
@@ -100,34 +198,272 @@ def press_i(img):
         lines.append(line)
 
     # 将输入内容拼接成完整的文章
-    description = "\n".join(lines)
-
-
-def press_o(img):
-    global description
-    print("请选题目区域：")
-    selector = ROISelector(img)
-    img = selector.select_roi()
-    img = Image.fromarray(img)
+    set_description("\n".join(lines))
+
+
+def press_o(img, refresh=False):
+    """
+    :param img: 当前帧
+    :param refresh: 为True时跳过OCR缓存和答案缓存，强制重新识别和生成
+    """
+    if speculator is not None and not refresh:
+        job = speculator.current_job()
+        if job is not None:
+            choice = str(input("后台已识别当前画面的题目，直接回车使用，输入r重新框选："))
+            if choice.strip().lower() != "r":
+                answer_speculative(job)
+                return
+            speculator.discard()
+
+    print("请选题目区域(可连续框选多道题，按回车结束)：")
+    selector, rois = select_regions(img, roi_templates.QUESTION, multi=True)
+    if not rois:
+        print("未选择任何区域")
+        return
     print("提示词：")
     print(description)
     print("\n正在分析问题，请稍等。。。。。。")
-    question = OCR_identify.ocr_identify(img)
-    content = " ".join(question)
-    print("获取到问题:")
-    print(content)
-    if description.strip().lower() != "none":
-        content = "请帮我解决以下问题：\n " + description + content
+
+    prefix = build_prefix()
+    if speculator is not None and SPECULATIVE_ROI is None and len(rois) == 1:
+        # 记住框选的区域，之后画面变化时在后台识别同一位置
+        height, width = img.shape[:2]
+        x1, y1, x2, y2 = selector.coordinates_list[0]
+        speculator.set_region((x1 / width, y1 / height, x2 / width, y2 / height))
+
+    timeline = StageTimeline()
+    prefill_future = None
+    if engine.is_ready():
+        # 识别题目期间模型先计算系统提示词和题干的KV缓存
+        prefill_future = prefill_executor.submit(prefill_prefix, prefix, timeline)
+    # 按顺序提交识别任务，解答前面的题目时后面的题目继续识别
+    ocr_futures = [ocr_executor.submit(ocr_question, index, roi, timeline, refresh)
+                   for index, roi in enumerate(rois, 1)]
+
+    # 已缓存的直接输出，其余的交给模型
+    uncached = []
+    for index, future in enumerate(ocr_futures, 1):
+        content, ocr_stats = future.result()
+        print(f"获取到问题{index}:" if len(rois) > 1 else "获取到问题:")
+        print(content)
+        if OCR_AUTO_CROP:
+            print(OCR_identify.format_crop_stats(ocr_stats))
+
+        cache_key = AnswerCache.make_key(content, description, GENERATION_SETTINGS)
+        cached = None if refresh else answer_cache.get(cache_key)
+        if cached is not None:
+            print("\n=========大模型答案(缓存)=========")
+            print(cached)
+            print(answer_cache.format_stats())
+            continue
+        if PIPELINE_ANSWERS and engine.is_ready():
+            answer_pipelined((content, prefix, cache_key), index, timeline)
+        else:
+            uncached.append((content, prefix, cache_key))
+    print(OCR_identify.ocr_cache.format_stats())
+    if prefill_future is not None and prefill_future.exception() is not None:
+        print(f"⚠️ 前缀预计算失败: {prefill_future.exception()}")
+    if PIPELINE_ANSWERS:
+        timeline.report()
+
+    if not uncached:
+        return
+
+    if not engine.is_ready():
+        # 模型还在加载，问题先排队，加载完成后由后台线程依次解答
+        for item in uncached:
+            pending_questions.put(item)
+        print(f"模型仍在加载，问题已加入队列(排队数: {pending_questions.qsize()})")
+        return
+
+    if CHOICE_SCORING:
+        # 选择题只做一次前向打分，解析按需生成
+        choice_items = [item for item in uncached if llm.detect_options(item[0])]
+        if choice_items:
+            answer_choices(choice_items)
+            if str(input("是否需要生成解析(是请输入yes)：")).strip().lower() != "yes":
+                uncached = [item for item in uncached if item not in choice_items]
+            if not uncached:
+                return
+
+    if len(uncached) == 1:
+        answer_question(*uncached[0])
     else:
-        content = "请帮我解决以下问题：\n " + content
-    response = get_response(content)
+        answer_questions_batch(uncached)
+
+
+def select_regions(img, kind, multi):
+    """
+    框选区域，当前窗口已保存的模板在框选窗口中按数字键直接使用，按's'结束时把本次框选保存为模板
+    :param kind: roi_templates.QUESTION / roi_templates.DESCRIPTION
+    :return: (selector, select_roi的返回值)
+    """
+    templates = template_store.entries(template_scope, kind)[:9]
+    if templates:
+        print("已保存的区域模板(按数字键直接使用)：")
+        for number, (name, boxes) in enumerate(templates, 1):
+            print(f"  {number}. {name} ({len(boxes)}个区域)")
+    print("按's'结束并保存为模板")
+    selector = ROISelector(img, multi=multi, templates=templates)
+    result = selector.select_roi()
+
+    if selector.template_name is not None:
+        print(f"使用区域模板: {selector.template_name}")
+    elif selector.save_requested:
+        name = str(input("请输入模板名称(直接回车不保存)：")).strip()
+        if name:
+            height, width = img.shape[:2]
+            template_store.save(template_scope, kind, name, selector.coordinates_list, width, height)
+            print(f"已保存区域模板: {name}")
+    return selector, result
+
+
+def build_prefix():
+    """提问的共享前缀：固定的指令加上题干"""
+    return llm.build_question_prefix(description)
+
+
+def prepare_question(question_text):
+    """后台推测解答使用：返回(完整提示词, 共享前缀, 答案缓存键)"""
+    prefix = build_prefix()
+    return prefix + question_text, prefix, AnswerCache.make_key(question_text, description, GENERATION_SETTINGS)
+
+
+def speculative_ocr(roi):
+    return OCR_identify.identify_question(roi, auto_crop=OCR_AUTO_CROP)
+
+
+def answer_speculative(job):
+    """输出后台推测解答的结果，仍在生成时接着流式输出"""
+    print("获取到问题(后台识别):")
+    print(job.question)
+    title = "大模型答案(缓存)" if job.cached else "大模型答案(后台生成)"
+    print(f"\n========={title}=========")
+    for text in speculator.take(job):
+        print(text, end="", flush=True)
+    print()
+    if job.error is not None:
+        print(f"⚠️ 生成失败: {job.error}")
+    elif job.cached:
+        print(answer_cache.format_stats())
+    else:
+        print(llm.format_stats(job.stats))
+
+
+def interactive():
+    """按键操作期间让后台推测解答让出模型"""
+    return speculator.interactive() if speculator is not None else nullcontext()
 
+
+def prefill_prefix(prefix, timeline):
+    """在后台线程中预先计算共享前缀的KV缓存"""
+    with timeline.phase("前缀prefill"):
+        return engine.prefill(prefix)
+
+
+def ocr_question(index, roi, timeline, refresh=False):
+    """在识别线程中执行：识别一道题目，返回(题目文本, OCR统计)"""
+    ocr_stats = {}
+    with timeline.phase(f"OCR {index}"):
+        question = OCR_identify.identify_question(roi, auto_crop=OCR_AUTO_CROP, use_cache=not refresh,
+                                                  stats=ocr_stats)
+    return question, ocr_stats
+
+
+def answer_pipelined(item, index, timeline):
+    """
+    流水线中解答一道题，此时后面的题目仍在识别线程中识别
+    :param item: (question_text, prefix, cache_key)
+    """
+    if CHOICE_SCORING and llm.detect_options(item[0]):
+        with timeline.phase(f"打分 {index}"):
+            answer_choices([item])
+        if str(input("是否需要生成解析(是请输入yes)：")).strip().lower() != "yes":
+            return
+    with timeline.phase(f"解码 {index}"):
+        answer_question(*item)
+
+
+def answer_choices(items):
+    """
+    选择题打分，直接给出选项和各选项概率
+    :param items: [(question_text, prefix, cache_key), ...]
+    """
+    for index, (question_text, prefix, _) in enumerate(items, 1):
+        options = llm.detect_options(question_text)
+        stats = {}
+        choice, probabilities = engine.score_options(prefix + question_text, options,
+                                                     prompt_prefix=prefix, stats=stats)
+        title = f"选择题答案{index}" if len(items) > 1 else "选择题答案"
+        print(f"\n========={title}=========")
+        print(f"答案: {choice}")
+        print(" | ".join(f"{letter}: {prob:.1%}" for letter, prob in probabilities.items()))
+        print(f"耗时: {stats.get('total', 0):.2f}s")
+
+
+def answer_question(question_text, prefix, cache_key):
+    """流式生成并打印答案，结束后写入答案缓存"""
+    content = prefix + question_text
     print("\n=========大模型答案=========")
-    print(response)
+    stats = {}
+    pieces = []
+    for text in stream_response(content, stats, prompt_prefix=prefix):
+        print(text, end="", flush=True)
+        pieces.append(text)
+    print()
+    print(llm.format_stats(stats))
+
+    answer_cache.put(cache_key, question_text, "".join(pieces))
+    print(answer_cache.format_stats())
+
+
+def answer_questions_batch(items):
+    """
+    多道题合并为一次generate批量解答，按选择顺序输出
+    :param items: [(question_text, prefix, cache_key), ...]
+    """
+    prompts = [prefix + question_text for question_text, prefix, _ in items]
+    print(f"\n正在批量解答{len(prompts)}道题......")
+    stats = {}
+    responses = engine.batch_responses(prompts, max_new_tokens=MAX_NEW_TOKENS, stats=stats)
+
+    for index, ((question_text, _, cache_key), response) in enumerate(zip(items, responses), 1):
+        print(f"\n=========大模型答案{index}=========")
+        print(question_text)
+        print("-" * 40)
+        print(response)
+        answer_cache.put(cache_key, question_text, response)
+    print(llm.format_stats(stats))
+    print(answer_cache.format_stats())
+
+
+def drain_pending_questions():
+    """等待模型加载完成后解答启动期间排队的问题"""
+    try:
+        engine.wait()
+    except RuntimeError:
+        return
+    while True:
+        question_text, prefix, cache_key = pending_questions.get()
+        print(f"\n开始解答排队的问题: {question_text}")
+        answer_question(question_text, prefix, cache_key)
+
+
+pending_questions = queue.Queue()
+threading.Thread(target=drain_pending_questions, daemon=True).start()
 
+speculator = None
+if SPECULATIVE_ANSWERS:
+    speculator = SpeculativeAnswerer(engine, answer_cache, speculative_ocr, prepare_question,
+                                     region=SPECULATIVE_ROI, max_new_tokens=MAX_NEW_TOKENS)
+
+
+# 画面未变化时跳过颜色转换和重绘，空闲时降低捕获帧率
+frame_detector = FrameChangeDetector()
+capture_fps = frame_detector.active_fps
 
 # 开始捕获
-camera.start(region=region, target_fps=60)
+camera.start(region=region, target_fps=capture_fps)
 print(f"正在捕获窗口: {window_name} (初始区域: {region})")
 print("按 'q' 键退出...")
 
@@ -141,55 +477,73 @@ fx, fy = -1, -1  # 矩形结束坐标
 # 记录上次区域和检查时间
 last_region = region
 last_check_time = time.time()
-window_missing_count = 0
 description = 'None'
+latest_raw = None  # 最近一次捕获的原始帧，按键时转换后在其上框选
+
+
+def latest_frame():
+    """
+    按键时使用的当前画面
+    不依赖画面变化检测：跨步采样的签名可能漏掉只改了几个字的画面(如"Q17"变成"Q21")，
+    这类帧没有重绘，但框选和识别必须用最新捕获的帧
+    """
+    return None if latest_raw is None else cv2.cvtColor(latest_raw, cv2.COLOR_BGR2RGB)
+
 
 time.sleep(0.1)
+startup_timer.report(pending=() if engine.is_ready() else ("模型加载",))
 print("==========初始化结束==========")
-print("按下'o'读入题目， 按下'i'录入题干\n")
+print("按下'o'读入题目， 按下'i'录入题干， 按下'p'忽略缓存重新解答\n")
 if __name__ == "__main__":
     try:
         while True:
-            # 每隔0.3秒检查一次窗口位置是否变化
-            if time.time() - last_check_time > 0.3:
-                new_region = get_window_rect_by_title(window_name)
-
-                if new_region is None:
-                    window_missing_count += 1
-                    if window_missing_count > 3:  # 连续3次检测不到窗口
-                        print("窗口已移出屏幕或关闭，等待窗口返回...")
-                        camera.stop()
-                        # 等待窗口重新出现
-                        while new_region is None:
-                            time.sleep(0.5)
-                            new_region = get_window_rect_by_title(window_name)
-                        print("窗口已恢复，重新开始捕获")
-                        camera.start(region=new_region)
-                        window_missing_count = 0
-                elif new_region != last_region:
+            # 每隔0.1秒检查一次窗口位置是否变化(只读取窗口句柄的位置，开销很小)
+            if window_tracker is not None and time.time() - last_check_time > 0.1:
+                event, new_region = window_tracker.poll()
+
+                if event == "lost":  # 连续3次检测不到窗口
+                    print("窗口已移出屏幕或关闭，等待窗口返回...")
+                    camera.stop()
+                    # 等待窗口重新出现
+                    new_region = window_tracker.wait()
+                    print("窗口已恢复，重新开始捕获")
+                    camera.start(region=new_region, target_fps=capture_fps)
+                    frame_detector.reset()
+                    last_region = new_region
+                elif event == "moved":
                     print(f"检测到窗口移动，更新捕获区域: {new_region}")
                     camera.stop()
-                    camera.start(region=new_region)
+                    camera.start(region=new_region, target_fps=capture_fps)
+                    frame_detector.reset()
                     last_region = new_region
-                    window_missing_count = 0
 
                 last_check_time = time.time()
 
-            # 获取最新帧
-            frame = camera.get_latest_frame()
+            # 进入/离开空闲时调整捕获帧率
+            if frame_detector.target_fps() != capture_fps:
+                capture_fps = frame_detector.target_fps()
+                camera.stop()
+                camera.start(region=last_region, target_fps=capture_fps)
 
-            if frame is not None:
-                # 变换图像格式
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                # 显示帧
-                cv2.imshow("Captured Window", frame)
+            # 获取最新帧
+            raw_frame = camera.get_latest_frame()
+            if raw_frame is not None:
+                latest_raw = raw_frame
+
+            # 画面变化检测只决定是否重绘
+            changed = raw_frame is not None and frame_detector.is_changed(raw_frame)
+            if changed:
+                # 变换图像格式并显示帧
+                cv2.imshow("Captured Window", cv2.cvtColor(raw_frame, cv2.COLOR_BGR2RGB))
+            if speculator is not None and latest_raw is not None:
+                speculator.observe(latest_raw, changed)
 
             # 检查是否按下了 'i' 键
             if keyboard.is_pressed('i') and i_flag:
                 i_flag = False
                 print("\n检测到 'i' 键按下，请输入新的指令:")
-                frame = Image.fromarray(frame)
-                press_i(frame)
+                with interactive():
+                    press_i(latest_frame())
                 print("==========题干录入完毕==========")
                 print("按下'o'读入题目， 按下'i'录入题干\n")
                 i_flag = True
@@ -198,13 +552,24 @@ if __name__ == "__main__":
             if keyboard.is_pressed('o') and o_flag:
                 o_flag = False
                 print("\n检测到'o'按下，将自动做题")
-                press_o(frame)
+                with interactive():
+                    press_o(latest_frame())
+                print("==========题目分析完毕==========")
+                print("按下'o'读入题目， 按下'i'录入题干\n")
+                o_flag = True
+
+            # 检查是否按下了 'p' 键，跳过答案缓存重新解答
+            if keyboard.is_pressed('p') and o_flag:
+                o_flag = False
+                print("\n检测到'p'按下，将忽略缓存重新做题")
+                with interactive():
+                    press_o(latest_frame(), refresh=True)
                 print("==========题目分析完毕==========")
                 print("按下'o'读入题目， 按下'i'录入题干\n")
                 o_flag = True
 
-            # 检测按键
-            if cv2.waitKey(30) & 0xFF == ord('q'):
+            # 检测按键，画面空闲时放慢轮询
+            if cv2.waitKey(frame_detector.wait_delay()) & 0xFF == ord('q'):
                 break
 
     except Exception as e:
@@ -212,6 +577,12 @@ if __name__ == "__main__":
     finally:
         # 确保资源被释放
         camera.stop()
+        print(frame_detector.format_stats())
+        if speculator is not None:
+            print(speculator.format_stats())
+        if window_tracker is not None:
+            print(window_tracker.format_stats())
+        answer_cache.close()
         cv2.destroyAllWindows()
         if process:
             clean_proc(process)
@@ -0,0 +1,172 @@
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+def to_gray(img_arr):
+    """numpy图像(灰度/RGB/RGBA) -> 灰度"""
+    if img_arr.ndim == 3:
+        code = cv2.COLOR_RGBA2GRAY if img_arr.shape[2] == 4 else cv2.COLOR_RGB2GRAY
+        return cv2.cvtColor(img_arr, code)
+    return img_arr
+
+
+def dhash(img_arr, hash_size=16):
+    """
+    差值哈希(dHash)：缩小为(hash_size+1)×hash_size的灰度图，比较相邻像素明暗
+    裁剪边缘差一两个像素时哈希基本不变
+    :param img_arr: numpy图像(灰度或三通道)
+    :return: hash_size*hash_size位的整数
+    """
+    small = cv2.resize(to_gray(img_arr), (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def downscale(gray, scale):
+    """
+    按整数倍缩小(INTER_AREA)，先裁掉除不尽的边缘，保证每个缩小后的像素正好对应原图scale×scale的块
+    """
+    height, width = max(gray.shape[0] // scale, 1), max(gray.shape[1] // scale, 1)
+    return cv2.resize(gray[:height * scale, :width * scale], (width, height), interpolation=cv2.INTER_AREA)
+
+
+def profiles(gray):
+    """:return: (每列平均亮度, 每行平均亮度)，用于估计两次框选之间的整像素偏移"""
+    return (cv2.reduce(gray, 0, cv2.REDUCE_AVG, dtype=cv2.CV_32F).ravel(),
+            cv2.reduce(gray, 1, cv2.REDUCE_AVG, dtype=cv2.CV_32F).ravel())
+
+
+def estimate_shift(profile, other, max_shift):
+    """
+    在±max_shift内搜索一维偏移d，使other[i]与profile[i + d]最接近
+    """
+    length = min(len(profile), len(other)) - 2 * max_shift
+    if length <= 0:
+        return 0
+    errors = [np.abs(profile[max_shift + d:max_shift + d + length] - other[max_shift:max_shift + length]).sum()
+              for d in range(-max_shift, max_shift + 1)]
+    return int(np.argmin(errors)) - max_shift
+
+
+def content_difference(small, other, offset, block=2):
+    """
+    逐块比较两张按相同像素网格缩小的灰度图(见OCRCache._same_content)
+    网格不一致时重采样误差会淹没"17"和"21"这样的差别
+    :param offset: (x, y)，other[i, j]对应small[i + y, j + x]
+    :param block: 比较的块边长，取各块平均差的最大值，局部的几个字不同也能检出
+    :return: 重叠部分的最大块平均差(0-255)，重叠部分太小时返回None
+    """
+    x, y = offset
+    top, left = max(y, 0), max(x, 0)
+    bottom, right = min(small.shape[0], other.shape[0] + y), min(small.shape[1], other.shape[1] + x)
+    if bottom - top < block or right - left < block:
+        return None
+    diff = cv2.absdiff(small[top:bottom, left:right], other[top - y:bottom - y, left - x:right - x])
+    blocks = cv2.resize(diff, ((right - left) // block, (bottom - top) // block), interpolation=cv2.INTER_AREA)
+    return float(blocks.max())
+
+
+class OCRCache:
+    """
+    OCR结果缓存，按感知哈希的汉明距离筛选候选，再对齐比较缩小图的内容确认，几乎相同的框选区域也能命中
+    每个条目只保存缩小scale倍的灰度图和行列亮度曲线，内存有上限；命中时比较的也是缩小图，耗时在1ms以内
+    """
+
+    def __init__(self, capacity=128, max_distance=16, size_tolerance=0.05, hash_size=16, max_shift=4, scale=4,
+                 max_block_diff=8):
+        """
+        :param capacity: 最多缓存的条目数，超出后淘汰最久未使用的
+        :param max_distance: 作为候选的最大汉明距离
+        :param size_tolerance: 宽高允许的相对差异，避免不同大小的区域哈希碰撞
+        :param hash_size: dHash边长
+        :param max_shift: 内容比较时允许的框选偏移(像素)
+        :param scale: 保存和比较内容时的缩小倍数
+        :param max_block_diff: 判定为同一内容的最大块平均差(见content_difference)
+        """
+        self.capacity = capacity
+        self.max_distance = max_distance
+        self.size_tolerance = size_tolerance
+        self.hash_size = hash_size
+        self.max_shift = max_shift
+        self.scale = scale
+        self.max_block_diff = max_block_diff
+        self.entries = OrderedDict()  # (hash, settings) -> (缩小的灰度图, 行列亮度曲线, 原尺寸, paragraphs)
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0  # 哈希相近但内容不同
+        self._lock = threading.Lock()
+
+    def _similar_size(self, width, height, other_width, other_height):
+        return (abs(width - other_width) <= self.size_tolerance * max(width, other_width) and
+                abs(height - other_height) <= self.size_tolerance * max(height, other_height))
+
+    def _same_content(self, gray, profile, entry_small, entry_profile):
+        # 先用行列亮度曲线估计新区域相对缓存条目的整像素偏移，裁掉余数后再缩小，
+        # 两张缩小图的像素网格对齐，同一内容的差异只剩噪声
+        dx = estimate_shift(entry_profile[0], profile[0], self.max_shift)
+        dy = estimate_shift(entry_profile[1], profile[1], self.max_shift)
+        crop_x, crop_y = (-dx) % self.scale, (-dy) % self.scale
+        small = downscale(gray[crop_y:, crop_x:], self.scale)
+        offset = ((crop_x + dx) // self.scale, (crop_y + dy) // self.scale)
+        difference = content_difference(entry_small, small, offset)
+        return difference is not None and difference <= self.max_block_diff
+
+    def lookup(self, img_arr, settings):
+        """
+        :param img_arr: numpy图像
+        :param settings: 影响OCR结果的参数(如lang、d_conf)，需可哈希
+        :return: (命中的段落列表或None, 图像签名)，签名可直接交给store
+        """
+        gray = to_gray(img_arr)
+        small = downscale(gray, self.scale)
+        img_hash = dhash(small, self.hash_size)  # 在缩小图上计算，比原图快得多
+        height, width = gray.shape[:2]
+        profile = None
+        with self._lock:
+            for key, (entry_small, entry_profile, entry_size, paragraphs) in reversed(self.entries.items()):
+                entry_hash, entry_settings = key
+                if entry_settings != settings:
+                    continue
+                if bin(entry_hash ^ img_hash).count("1") > self.max_distance:
+                    continue
+                if not self._similar_size(width, height, entry_size[1], entry_size[0]):
+                    continue
+                # 快速路径：尺寸和哈希都相同时直接比较缩小图，画面没动的重复识别不需要对齐
+                if not (entry_hash == img_hash and entry_size == (height, width) and
+                        np.array_equal(small, entry_small)):
+                    if profile is None:
+                        profile = profiles(gray)
+                    if not self._same_content(gray, profile, entry_small, entry_profile):
+                        self.rejected += 1
+                        continue
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return list(paragraphs), (img_hash, gray)
+            self.misses += 1
+        return None, (img_hash, gray)
+
+    def store(self, signature, settings, paragraphs):
+        """
+        :param signature: lookup返回的图像签名
+        """
+        img_hash, gray = signature
+        entry = (downscale(gray, self.scale), profiles(gray), gray.shape[:2], list(paragraphs))
+        with self._lock:
+            key = (img_hash, settings)
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def format_stats(self):
+        total = self.hits + self.misses
+        hit_rate = self.hits / total if total else 0.0
+        return (f"OCR缓存 命中率: {hit_rate:.0%} | 命中: {self.hits} | 未命中: {self.misses} | "
+                f"内容不同: {self.rejected} | 条目: {len(self.entries)}")
@@ -0,0 +1,97 @@
+"""
+框选区域模板：同一个App的题目/题干通常出现在每页的相同位置，保存一次框选后按数字键直接使用
+坐标按窗口宽高归一化保存，窗口大小变化(如投屏分辨率不同)后仍然可用
+"""
+import json
+import os
+import threading
+
+DEFAULT_TEMPLATE_PATH = "roi_templates.json"
+
+QUESTION = "question"        # 按'o'框选的题目区域
+DESCRIPTION = "description"  # 按'i'框选的题干区域
+
+
+def normalize_boxes(coordinates_list, width, height):
+    """像素坐标[(x1, y1, x2, y2), ...] -> 归一化坐标"""
+    return [(round(x1 / width, 5), round(y1 / height, 5), round(x2 / width, 5), round(y2 / height, 5))
+            for x1, y1, x2, y2 in coordinates_list]
+
+
+def denormalize_boxes(boxes, width, height):
+    """
+    归一化坐标 -> 像素坐标，超出图像的部分被裁掉，裁剪后为空的区域被丢弃
+    """
+    result = []
+    for x0, y0, x1, y1 in boxes:
+        left = max(0, min(int(round(x0 * width)), width))
+        top = max(0, min(int(round(y0 * height)), height))
+        right = max(0, min(int(round(x1 * width)), width))
+        bottom = max(0, min(int(round(y1 * height)), height))
+        if right > left and bottom > top:
+            result.append((left, top, right, bottom))
+    return result
+
+
+class ROITemplateStore:
+    """
+    按作用域(窗口标题或App名)和用途(题目/题干)保存命名的区域模板，JSON持久化
+    文件结构: {作用域: {用途: {模板名: [[x0, y0, x1, y1], ...]}}}
+    """
+
+    def __init__(self, path=DEFAULT_TEMPLATE_PATH):
+        """
+        :param path: JSON文件路径，不存在时在第一次保存时创建
+        """
+        self.path = path
+        self.templates = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.templates = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ 读取区域模板失败({path}): {e}")
+
+    def entries(self, scope, kind):
+        """
+        :return: [(模板名, [归一化坐标, ...]), ...]，按保存顺序
+        """
+        with self._lock:
+            named = self.templates.get(scope, {}).get(kind, {})
+            return [(name, [tuple(box) for box in boxes]) for name, boxes in named.items()]
+
+    def get(self, scope, kind, name):
+        """不存在时返回None"""
+        with self._lock:
+            boxes = self.templates.get(scope, {}).get(kind, {}).get(name)
+            return None if boxes is None else [tuple(box) for box in boxes]
+
+    def save(self, scope, kind, name, coordinates_list, width, height):
+        """
+        保存一次框选，同名模板被覆盖
+        :param coordinates_list: 像素坐标[(x1, y1, x2, y2), ...]
+        :param width: 框选时图像的宽
+        :param height: 框选时图像的高
+        """
+        boxes = [list(box) for box in normalize_boxes(coordinates_list, width, height)]
+        with self._lock:
+            self.templates.setdefault(scope, {}).setdefault(kind, {})[name] = boxes
+            self._write()
+
+    def delete(self, scope, kind, name):
+        """删除模板，返回是否存在"""
+        with self._lock:
+            named = self.templates.get(scope, {}).get(kind, {})
+            if name not in named:
+                return False
+            del named[name]
+            self._write()
+            return True
+
+    def _write(self):
+        # 先写临时文件再替换，写入中途退出也不会损坏已有模板
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.templates, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,237 @@
+"""
+后台推测解答：画面变化并稳定下来后，自动识别题目区域并以低优先级开始生成答案
+画面再次变化时取消；按'o'时如果画面没变，答案已经生成完或正在生成，可以直接接着输出
+"""
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import cv2
+
+
+class SpeculativeJob:
+    """一次推测解答，生成的文本片段可以被多个读者跟随输出"""
+
+    def __init__(self, generation, question, prompt, prefix, cache_key):
+        self.generation = generation  # 对应的画面版本
+        self.question = question
+        self.prompt = prompt
+        self.prefix = prefix
+        self.cache_key = cache_key
+        self.pieces = []
+        self.stats = {}
+        self.cached = False  # 答案来自答案缓存
+        self.error = None
+        self.cancelled = threading.Event()
+        self.promoted = threading.Event()  # 用户已在等待这道题，不再让位于交互操作
+        self.done = threading.Event()
+        self._cond = threading.Condition()
+
+    def append(self, piece):
+        with self._cond:
+            self.pieces.append(piece)
+            self._cond.notify_all()
+
+    def finish(self, error=None):
+        with self._cond:
+            self.error = error
+            self.done.set()
+            self._cond.notify_all()
+
+    def cancel(self):
+        with self._cond:
+            self.cancelled.set()
+            self._cond.notify_all()
+
+    @property
+    def answer(self):
+        return "".join(self.pieces)
+
+    def follow(self):
+        """
+        依次返回已生成和之后生成的文本片段，直到生成结束或被取消
+        调用即表示用户在等待，后台生成不再让位
+        """
+        self.promoted.set()
+        index = 0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: index < len(self.pieces) or self.done.is_set() or
+                                    self.cancelled.is_set())
+                new_pieces = self.pieces[index:]
+                finished = self.done.is_set() or self.cancelled.is_set()
+            for piece in new_pieces:
+                yield piece
+            index += len(new_pieces)
+            if finished and index >= len(self.pieces):
+                return
+
+
+class SpeculativeAnswerer:
+    """
+    主循环每帧调用observe，画面稳定stable_after秒后在后台线程中识别区域并开始生成
+    交互操作(按'i'/'o')进行期间不开始新的生成，避免与前台抢占模型
+    """
+
+    def __init__(self, engine, answer_cache, ocr_func, prepare_func, region=None, stable_after=0.8,
+                 max_new_tokens=256):
+        """
+        :param engine: llm.LocalLLM 或 llm_client.LLMClient
+        :param answer_cache: AnswerCache，命中时不再生成，生成完成后写入
+        :param ocr_func: ocr_func(roi图像) -> 题目文本
+        :param prepare_func: prepare_func(题目文本) -> (prompt, prefix, cache_key)
+        :param region: 题目区域的归一化坐标(x0, y0, x1, y1)，None时不做推测
+        :param stable_after: 画面保持不变多久(s)后开始
+        :param max_new_tokens: 最大生成token数
+        """
+        self.engine = engine
+        self.answer_cache = answer_cache
+        self.ocr_func = ocr_func
+        self.prepare_func = prepare_func
+        self.region = region
+        self.stable_after = stable_after
+        self.max_new_tokens = max_new_tokens
+        self.job = None
+        self.generation = 0          # 画面版本，每次变化加一
+        self._scheduled = -1         # 已提交识别的画面版本
+        self._changed_at = time.perf_counter()
+        self._busy = 0
+        self._busy_lock = threading.Lock()
+        self._tasks = queue.Queue()
+        # 统计
+        self.started = 0
+        self.cancelled = 0
+        self.completed = 0
+        self.used = 0
+        threading.Thread(target=self._run, daemon=True).start()
+
+    # ==================== 主线程调用 ====================
+    def observe(self, frame, changed):
+        """
+        :param frame: 最新捕获的原始帧(BGR)，只在需要识别时裁剪题目区域并转换颜色
+        :param changed: 该帧相对上一帧是否变化(见FrameChangeDetector)
+        """
+        now = time.perf_counter()
+        if changed:
+            self.generation += 1
+            self._changed_at = now
+            self._cancel_current()
+            return
+        if self.region is None or self._busy or self._scheduled == self.generation:
+            return
+        if now - self._changed_at < self.stable_after:
+            return
+
+        self._scheduled = self.generation
+        height, width = frame.shape[:2]
+        x0, y0, x1, y1 = self.region
+        roi = frame[int(y0 * height):int(y1 * height), int(x0 * width):int(x1 * width)]
+        if roi.size:
+            self._tasks.put((self.generation, cv2.cvtColor(roi, cv2.COLOR_BGR2RGB)))
+
+    def set_region(self, region):
+        """更换题目区域，当前画面重新识别"""
+        self.region = region
+        self._cancel_current()
+        self._scheduled = -1
+
+    def current_job(self):
+        """当前画面对应的推测结果(可能仍在生成)，画面已变化或没有结果时返回None"""
+        job = self.job
+        if job is None or job.generation != self.generation or job.cancelled.is_set():
+            return None
+        return job
+
+    def take(self, job):
+        """用户选择使用该推测结果"""
+        self.used += 1
+        return job.follow()
+
+    @contextmanager
+    def interactive(self):
+        """交互操作期间不开始新的推测生成"""
+        with self._busy_lock:
+            self._busy += 1
+        try:
+            yield
+        finally:
+            with self._busy_lock:
+                self._busy -= 1
+
+    def discard(self):
+        """用户不使用推测结果(如重新框选)，取消正在进行的生成，让出模型"""
+        self._cancel_current()
+
+    def _cancel_current(self):
+        job = self.job
+        if job is not None and not job.done.is_set() and not job.cancelled.is_set():
+            job.cancel()
+            self.cancelled += 1
+
+    # ==================== 后台线程 ====================
+    def _stale(self, generation):
+        return generation != self.generation
+
+    def _run(self):
+        while True:
+            generation, roi = self._tasks.get()
+            if self._stale(generation):
+                continue
+            try:
+                question = self.ocr_func(roi)
+            except Exception as e:
+                print(f"\n⚠️ 后台识别失败: {e}")
+                continue
+            if self._stale(generation) or not question.strip():
+                continue
+
+            prompt, prefix, cache_key = self.prepare_func(question)
+            job = SpeculativeJob(generation, question, prompt, prefix, cache_key)
+            self.job = job
+            if self._serve_cached(job):
+                continue
+            self._generate(job)
+
+    def _serve_cached(self, job):
+        """答案缓存中已有这道题时直接作为结果，返回是否命中"""
+        cached = self.answer_cache.get(job.cache_key)
+        if cached is None:
+            return False
+        job.cached = True
+        job.append(cached)
+        job.finish()
+        return True
+
+    def _generate(self, job):
+        # 低优先级：模型未就绪或用户正在交互时等待，期间画面变化则放弃
+        while not job.cancelled.is_set() and not job.promoted.is_set() and \
+                (self._busy or not self.engine.is_ready()):
+            time.sleep(0.1)
+        if job.cancelled.is_set() or self._stale(job.generation):
+            job.finish()
+            return
+        # 等待期间用户可能已在前台解答了同一道题，重新查一次缓存，避免重复生成
+        if self._serve_cached(job):
+            return
+
+        self.started += 1
+        try:
+            for piece in self.engine.stream_response(job.prompt, max_new_tokens=self.max_new_tokens,
+                                                     stats=job.stats, prompt_prefix=job.prefix,
+                                                     stop_event=job.cancelled):
+                if job.cancelled.is_set():
+                    break
+                job.append(piece)
+        except Exception as e:
+            job.finish(error=e)
+            return
+
+        if not job.cancelled.is_set():
+            self.answer_cache.put(job.cache_key, job.question, job.answer)
+            self.completed += 1
+        job.finish()
+
+    def format_stats(self):
+        return (f"推测解答 开始: {self.started} | 完成: {self.completed} | 取消: {self.cancelled} | "
+                f"被使用: {self.used}")
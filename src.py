@@ -1,9 +1,18 @@
 import subprocess
-import dxcam
 import cv2
-import pygetwindow as gw
 import time
-import pyautogui  # 用于获取屏幕尺寸
+import numpy as np
+from contextlib import contextmanager
+from roi_templates import denormalize_boxes
+
+try:
+    import pygetwindow as gw
+    import pyautogui  # 用于获取屏幕尺寸
+except Exception:  # pygetwindow不支持Linux(导入即报错)，无桌面环境时pyautogui也无法导入
+    gw = pyautogui = None
+
+# 能否按标题定位窗口，不能时main.py捕获整个屏幕
+WINDOW_TRACKING = gw is not None
 
 
 def get_device():
@@ -21,8 +30,21 @@ def get_device():
     return None
 
 
+def clamp_region(left, top, right, bottom, screen_width, screen_height):
+    """将窗口坐标限制在屏幕范围内，窗口完全移出屏幕时返回None"""
+    left = max(0, left)
+    top = max(0, top)
+    right = min(screen_width, right)
+    bottom = min(screen_height, bottom)
+    if left >= right or top >= bottom:
+        return None
+    return left, top, right, bottom
+
+
 def get_window_rect_by_title(window_title):
     """获取窗口当前的位置和大小，并确保在屏幕范围内"""
+    if gw is None:
+        return None
     try:
         window = gw.getWindowsWithTitle(window_title)[0]
 
@@ -30,19 +52,280 @@ def get_window_rect_by_title(window_title):
         screen_width, screen_height = pyautogui.size()
 
         # 确保窗口坐标在屏幕范围内
-        left = max(0, window.left)
-        top = max(0, window.top)
-        right = min(screen_width, window.right)
-        bottom = min(screen_height, window.bottom)
+        return clamp_region(window.left, window.top, window.right, window.bottom, screen_width, screen_height)
+
+    except IndexError:
+        return None
+
+
+class PygetwindowProvider:
+    """
+    WindowTracker使用的窗口接口，按标题查找只在找不到窗口时执行一次
+    之后只读取该窗口句柄的位置(Windows上为一次GetWindowRect)，窗口关闭时抛出异常
+    测试时可换成实现相同三个方法的假对象
+    """
+
+    def __init__(self):
+        if gw is None:
+            raise RuntimeError("pygetwindow不可用(仅支持Windows/macOS)，无法按标题定位窗口")
+
+    def find(self, title):
+        windows = gw.getWindowsWithTitle(title)
+        return windows[0] if windows else None
+
+    def geometry(self, window):
+        return window.left, window.top, window.right, window.bottom
 
-        # 如果窗口完全移出屏幕，返回None
-        if left >= right or top >= bottom:
+    def screen_size(self):
+        return pyautogui.size()
+
+
+class WindowTracker:
+    """
+    跟踪捕获窗口的位置，代替每次轮询都按标题枚举全部顶层窗口
+    区域变化需要保持debounce秒不变才生效，拖动窗口过程中不会反复重启捕获
+    """
+
+    def __init__(self, title, provider=None, debounce=0.3, missing_limit=3, screen_refresh=5.0,
+                 clock=time.perf_counter):
+        """
+        :param title: 窗口标题(支持部分匹配)
+        :param provider: 窗口接口，默认PygetwindowProvider
+        :param debounce: 新区域需要保持不变的时间(s)
+        :param missing_limit: 连续多少次读取不到窗口后报告丢失
+        :param screen_refresh: 屏幕尺寸缓存的刷新间隔(s)
+        :param clock: 时间函数，测试时可替换
+        """
+        self.title = title
+        self.provider = provider or PygetwindowProvider()
+        self.debounce = debounce
+        self.missing_limit = missing_limit
+        self.screen_refresh = screen_refresh
+        self.clock = clock
+        self.window = None
+        self.region = None  # 当前生效的捕获区域
+        self._pending = None
+        self._pending_since = None
+        self._missing = 0
+        self._screen = None
+        self._screen_time = None
+        self.lookups = 0  # 按标题查找窗口的次数
+        self.polls = 0
+
+    def _screen_size(self):
+        now = self.clock()
+        if self._screen is None or now - self._screen_time >= self.screen_refresh:
+            self._screen = tuple(self.provider.screen_size())
+            self._screen_time = now
+        return self._screen
+
+    def _read_region(self):
+        """读取窗口当前区域，窗口不存在或不在屏幕内时返回None"""
+        if self.window is None:
+            self.lookups += 1
+            self.window = self.provider.find(self.title)
+            if self.window is None:
+                return None
+        try:
+            left, top, right, bottom = self.provider.geometry(self.window)
+        except Exception:
+            # 窗口已关闭，下次重新按标题查找
+            self.window = None
             return None
+        return clamp_region(left, top, right, bottom, *self._screen_size())
 
-        return left, top, right, bottom
+    def locate(self):
+        """立即读取并采用当前区域(不防抖)"""
+        self.region = self._read_region()
+        self._pending = None
+        self._missing = 0
+        return self.region
 
-    except IndexError:
-        return None
+    def poll(self):
+        """
+        检查一次窗口位置
+        :return: (事件, 区域)，事件为None、"moved"(新区域已稳定)或"lost"(连续missing_limit次读取不到)
+        """
+        self.polls += 1
+        region = self._read_region()
+        if region is None:
+            self._pending = None
+            self._missing += 1
+            if self._missing == self.missing_limit:
+                self.region = None
+                return "lost", None
+            return None, self.region
+        self._missing = 0
+
+        if region == self.region:
+            self._pending = None
+            return None, self.region
+        now = self.clock()
+        if region != self._pending:
+            # 区域仍在变化(拖动中)，重新计时
+            self._pending = region
+            self._pending_since = now
+            return None, self.region
+        if now - self._pending_since >= self.debounce:
+            self.region = region
+            self._pending = None
+            return "moved", region
+        return None, self.region
+
+    def wait(self, interval=0.5):
+        """阻塞等待窗口重新出现，返回新区域"""
+        while self.locate() is None:
+            time.sleep(interval)
+        return self.region
+
+    def format_stats(self):
+        return f"窗口检查: {self.polls} 次 | 按标题查找: {self.lookups} 次"
+
+
+def wait_for_window(window_title, timeout=10.0, interval=0.1):
+    """
+    轮询等待窗口出现，代替启动投屏后的固定等待
+    :param window_title: 窗口标题(支持部分匹配)
+    :param timeout: 最长等待时间(s)
+    :param interval: 轮询间隔(s)
+    :return: 窗口区域，超时返回None
+    """
+    deadline = time.perf_counter() + timeout
+    while True:
+        region = get_window_rect_by_title(window_title)
+        if region is not None or time.perf_counter() >= deadline:
+            return region
+        time.sleep(interval)
+
+
+class StartupTimer:
+    """记录启动各阶段耗时，阶段之间可以并行"""
+
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter())
+
+    def record(self, name, start, end):
+        self.phases.append((name, start, end))
+
+    def report(self, pending=()):
+        """
+        打印启动耗时报告
+        :param pending: 尚未完成的阶段名称(如后台加载中的模型)
+        """
+        print("\n======启动耗时报告======")
+        for name, start, end in sorted(self.phases, key=lambda p: p[1]):
+            print(f"{name:<12} 开始 +{start - self.start_time:6.2f}s  耗时 {end - start:6.2f}s")
+        for name in pending:
+            print(f"{name:<12} 仍在后台进行")
+        print(f"{'总计':<12} {time.perf_counter() - self.start_time:.2f}s")
+
+
+class StageTimeline(StartupTimer):
+    """
+    记录流水线各阶段(OCR、prefill、解码)的起止时间，阶段可在不同线程中并行
+    report按时间轴画出各阶段，用于确认阶段之间确实发生了重叠
+    """
+
+    def report(self, width=40):
+        if not self.phases:
+            return
+        phases = sorted(self.phases, key=lambda p: p[1])
+        end_time = max(end for _, _, end in phases)
+        total = max(end_time - self.start_time, 1e-6)
+        print("\n======流水线时间线======")
+        for name, start, end in phases:
+            begin = int((start - self.start_time) / total * width)
+            length = max(1, int(round((end - start) / total * width)))
+            bar = " " * begin + "█" * min(length, width - begin)
+            # 中文字符占两列，按显示宽度补齐
+            padding = " " * max(0, 12 - sum(2 if ord(ch) > 0x2e80 else 1 for ch in name))
+            print(f"{name}{padding}|{bar:<{width}}| +{start - self.start_time:5.2f}s  {end - start:5.2f}s")
+        busy = sum(end - start for _, start, end in phases)
+        print(f"总耗时: {total:.2f}s | 各阶段耗时之和: {busy:.2f}s | 重叠节省: {max(busy - total, 0):.2f}s")
+
+
+class FrameChangeDetector:
+    """
+    用跨步采样得到的低分辨率帧签名判断画面是否变化
+    手机画面大部分时间是静止的，未变化的帧可以跳过颜色转换和重绘，并降低捕获帧率
+    """
+
+    def __init__(self, stride=8, pixel_threshold=24, min_changed=2, idle_after=2.0,
+                 active_fps=60, idle_fps=10, active_delay=30, idle_delay=100):
+        """
+        :param stride: 采样步长(px)，签名大小约为原图的1/stride²
+        :param pixel_threshold: 采样点亮度差超过该值视为变化，过滤视频解码噪声
+        :param min_changed: 变化的采样点数达到该值才认为画面变化
+        :param idle_after: 画面持续多久(s)未变化后进入空闲
+        :param active_fps: 活跃时的捕获帧率
+        :param idle_fps: 空闲时的捕获帧率
+        :param active_delay: 活跃时主循环waitKey的等待(ms)
+        :param idle_delay: 空闲时主循环waitKey的等待(ms)
+        """
+        self.stride = stride
+        self.pixel_threshold = pixel_threshold
+        self.min_changed = min_changed
+        self.idle_after = idle_after
+        self.active_fps = active_fps
+        self.idle_fps = idle_fps
+        self.active_delay = active_delay
+        self.idle_delay = idle_delay
+        self.last_signature = None
+        self.last_change_time = time.perf_counter()
+        self.processed = 0
+        self.skipped = 0
+
+    def signature(self, frame):
+        """跨步取样(不插值)，只读取约1/stride²的像素"""
+        sample = frame[::self.stride, ::self.stride]
+        if sample.ndim == 3:
+            sample = sample[:, :, 1]  # 绿色通道近似亮度，RGB/BGR通用
+        return sample.astype(np.int16)
+
+    def is_changed(self, frame):
+        """
+        :param frame: 当前帧(numpy数组)
+        :return: 与上一帧相比是否变化，第一帧和尺寸变化时总是返回True
+        """
+        signature = self.signature(frame)
+        last = self.last_signature
+        self.last_signature = signature
+        if last is None or last.shape != signature.shape or \
+                np.count_nonzero(np.abs(signature - last) > self.pixel_threshold) >= self.min_changed:
+            self.last_change_time = time.perf_counter()
+            self.processed += 1
+            return True
+        self.skipped += 1
+        return False
+
+    def reset(self):
+        """捕获区域变化后调用，下一帧总是视为变化"""
+        self.last_signature = None
+        self.last_change_time = time.perf_counter()
+
+    def is_idle(self):
+        return time.perf_counter() - self.last_change_time >= self.idle_after
+
+    def target_fps(self):
+        return self.idle_fps if self.is_idle() else self.active_fps
+
+    def wait_delay(self):
+        """主循环waitKey的等待时间(ms)，空闲时放慢轮询"""
+        return self.idle_delay if self.is_idle() else self.active_delay
+
+    def format_stats(self):
+        total = self.processed + self.skipped
+        skip_rate = self.skipped / total if total else 0.0
+        return f"帧处理: {self.processed} | 跳过: {self.skipped} | 跳过率: {skip_rate:.0%}"
 
 
 def clean_proc(proc):
@@ -57,50 +340,122 @@ def clean_proc(proc):
 
 
 class ROISelector:
-    def __init__(self, image):
+    LINE_MARGIN = 2  # 线宽2的矩形边框向两侧各延伸的像素(留余量)
+
+    def __init__(self, image, multi=False, templates=None):
+        """
+        :param image: 待框选的图像
+        :param multi: 为True时可连续框选多个区域，select_roi返回区域列表
+        :param templates: 已保存的区域模板[(名称, [归一化坐标(x0, y0, x1, y1), ...]), ...]，框选窗口中按数字键1-9直接使用
+        """
         self.image = image
         if self.image is None:
             raise ValueError("无法加载图像，请检查路径")
-        self.clone = self.image.copy()
+        self.multi = multi
+        self.templates = templates or []
+        self.template_name = None     # 使用了模板时为模板名
+        self.save_requested = False   # 按's'结束，由调用方把本次框选保存为模板
+        self.base = self.image  # 已完成的框选会画在base上(多选模式)
+        self.clone = self.image.copy()  # 显示用的图像，拖动时只恢复上一次画框的边框条带
+        self._drawn = None  # 画在clone上、不在base中的矩形
+        self._dirty = True  # clone有变化，需要重新显示
         self.roi = None
+        self.rois = []
+        self.coordinates_list = []
         self.drawing = False
         self.ix, self.iy = -1, -1
         self.fx, self.fy = -1, -1
 
     def select_roi(self):
         cv2.namedWindow("choose ROI")
-        cv2.imshow("choose ROI", self.clone)
         cv2.setMouseCallback("choose ROI", self._mouse_callback)
 
         while True:
-            cv2.imshow("choose ROI", self.clone)
+            if self._dirty:
+                cv2.imshow("choose ROI", self.clone)
+                self._dirty = False
             key = cv2.waitKey(1) & 0xFF
 
             if key == 13:  # ENTER退出
                 break
+            elif key == ord('s') and self.coordinates_list:  # 结束并保存为模板
+                self.save_requested = True
+                break
+            elif ord('1') <= key <= ord('9') and key - ord('1') < len(self.templates):
+                if self.apply_template(*self.templates[key - ord('1')]):
+                    break
             elif key == ord('r'):  # 重置
+                self.base = self.image
                 self.clone = self.image.copy()
+                self._drawn = None
+                self._dirty = True
                 self.roi = None
+                self.rois = []
+                self.coordinates_list = []
 
         cv2.destroyWindow("choose ROI")
+        if self.multi:
+            return self.rois
         return self.roi
 
+    def apply_template(self, name, boxes):
+        """
+        按模板的归一化坐标选取区域，代替手动框选
+        :return: 模板在当前图像上是否有有效区域
+        """
+        height, width = self.image.shape[:2]
+        coordinates_list = denormalize_boxes(boxes, width, height)
+        if not coordinates_list:
+            print(f"模板 {name} 在当前画面上没有有效区域")
+            return False
+        if not self.multi:
+            coordinates_list = coordinates_list[:1]
+
+        self.template_name = name
+        self.coordinates_list = coordinates_list
+        self.rois = [self.image[y1:y2, x1:x2] for x1, y1, x2, y2 in coordinates_list]
+        self.roi = self.rois[0]
+        self.coordinates = coordinates_list[0]
+        return True
+
+    def _erase(self):
+        """从base恢复上一次画的矩形边框所在的四条窄带，代替每次鼠标移动都复制整张图"""
+        if self._drawn is None:
+            return
+        x1, y1, x2, y2 = self._drawn
+        m = self.LINE_MARGIN
+        for top, bottom, left, right in ((y1 - m, y1 + m + 1, x1 - m, x2 + m + 1),
+                                         (y2 - m, y2 + m + 1, x1 - m, x2 + m + 1),
+                                         (y1 - m, y2 + m + 1, x1 - m, x1 + m + 1),
+                                         (y1 - m, y2 + m + 1, x2 - m, x2 + m + 1)):
+            top, left = max(0, top), max(0, left)
+            self.clone[top:bottom, left:right] = self.base[top:bottom, left:right]
+        self._drawn = None
+        self._dirty = True
+
+    def _draw(self, x1, y1, x2, y2):
+        x1, x2 = min(x1, x2), max(x1, x2)
+        y1, y2 = min(y1, y2), max(y1, y2)
+        cv2.rectangle(self.clone, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        self._drawn = (x1, y1, x2, y2)
+        self._dirty = True
+
     def _mouse_callback(self, event, x, y, flags, param):
         if event == cv2.EVENT_LBUTTONDOWN:
             self.drawing = True
             self.ix, self.iy = max(0, x), max(0, y)  # 确保不小于0
-            self.clone = self.image.copy()
+            self._erase()  # 单选模式下擦掉上一次的框
 
         elif event == cv2.EVENT_MOUSEMOVE:
             if self.drawing:
-                temp = self.image.copy()
                 x = max(0, min(x, self.image.shape[1] - 1))  # 限制在宽度范围内
                 y = max(0, min(y, self.image.shape[0] - 1))  # 限制在高度范围内
-                cv2.rectangle(temp, (self.ix, self.iy), (x, y), (0, 255, 0), 2)
-                self.clone = temp
+                self._erase()
+                self._draw(self.ix, self.iy, x, y)
 
         elif event == cv2.EVENT_LBUTTONUP:
             self.drawing = False
+            self._erase()
             fx = max(0, min(x, self.image.shape[1] - 1))  # 限制在宽度范围内
             fy = max(0, min(y, self.image.shape[0] - 1))  # 限制在高度范围内
 
@@ -111,4 +466,14 @@ class ROISelector:
             if x2 > x1 and y2 > y1:
                 self.roi = self.image[y1:y2, x1:x2]
                 self.coordinates = (x1, y1, x2, y2)
-                cv2.rectangle(self.clone, (x1, y1), (x2, y2), (0, 255, 0), 2)
+                self._draw(x1, y1, x2, y2)
+                if self.multi:
+                    self.rois.append(self.roi)
+                    self.coordinates_list.append(self.coordinates)
+                    # 标上序号，并把已完成的框保留到下一次框选(每完成一个框复制一次)
+                    cv2.putText(self.clone, str(len(self.rois)), (x1 + 4, y1 + 24),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
+                    self.base = self.clone.copy()
+                    self._drawn = None
+                else:
+                    self.coordinates_list = [self.coordinates]